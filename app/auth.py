@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 import bcrypt
@@ -5,32 +7,86 @@ from pydantic import BaseModel, EmailStr
 from typing import Optional
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.config import ALGORITHM, SECRET_KEY
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import ALGORITHM, SECRET_KEY, BCRYPT_ROUNDS, BCRYPT_WORKERS, BCRYPT_MAX_PENDING
 from app import models, schemas
-from app.database import get_db
+from app.database import get_async_db
+from app.user_cache import user_cache
+from app.leaderboard import leaderboard
+from app.log import get_logger
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 router = APIRouter()
+log = get_logger("auth")
+
+# bcrypt відпускає GIL, тому окремий пул потоків хешує паралельно і не блокує event loop
+hash_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+pending_hashes = 0
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 def get_password_hash(password: str) -> str:
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
-def authenticate_user(db, username_or_email: str, password: str):
-    user = db.query(models.User).filter((models.User.email == username_or_email) | (models.User.username == username_or_email)).first()
-    if not user or not verify_password(password, user.hashed_password):
+def needs_rehash(hashed_password: str) -> bool:
+    # Хеш має вигляд $2b$<вартість>$<сіль і хеш>
+    try:
+        return int(hashed_password.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+async def run_hashing(func, *args):
+    """Виконує bcrypt у пулі потоків, відмовляючи, коли черга переповнена"""
+    global pending_hashes
+    if pending_hashes >= BCRYPT_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, try again later",
+            headers={"Retry-After": "1"},
+        )
+    pending_hashes += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(hash_executor, func, *args)
+    finally:
+        pending_hashes -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await run_hashing(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await run_hashing(get_password_hash, password)
+
+async def authenticate_user(db: AsyncSession, username_or_email: str, password: str):
+    result = await db.execute(select(models.User).where((models.User.email == username_or_email) | (models.User.username == username_or_email)))
+    user = result.scalars().first()
+    if not user or not await verify_password_async(password, user.hashed_password):
         return False
+    if needs_rehash(user.hashed_password):
+        # Вартість змінилась, поки пароль відомий - перехешовуємо
+        user.hashed_password = await get_password_hash_async(password)
+        await db.commit()
     return user
 
 def get_user_by_email(db: Session, email: str):
     user = db.query(models.User).filter(models.User.email == email).first()
     if user is None:
-        print(f"User with email {email} not found")
+        log.info("user not found by email")
+    return user
+
+async def load_user_snapshot(db: AsyncSession, email: str):
+    """Знімок користувача з кешу; база читається лише при промаху"""
+    user = user_cache.get(email)
+    if user is None:
+        result = await db.execute(select(models.User).where(models.User.email == email))
+        db_user = result.scalars().first()
+        if db_user is None:
+            return None
+        user = user_cache.put(db_user)
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -42,7 +98,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -56,26 +112,27 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.email == user_email).first()
+    user = await load_user_snapshot(db, user_email)
     if user is None:
         raise credentials_exception
     return user
 
 @router.post("/register")
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter((models.User.email == user.email) | (models.User.username == user.username)).first()
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(models.User).where((models.User.email == user.email) | (models.User.username == user.username)))
+    existing_user = result.scalars().first()
     if existing_user:
         raise HTTPException(status_code=400, detail="User already exists")
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = models.User(email=user.email, username=user.username, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    leaderboard.update(db_user)
     return {"msg": "User registered successfully"}
 
 @router.post("/login", summary="Login user and get access token", tags=["Auth"])
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
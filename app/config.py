@@ -1,7 +1,13 @@
-import os 
+import os
+import socket
 
-DATABASE_URL = 'sqlite:///./mafia.db'
-SECRET_KEY = os.urandom(32)
+# Файл бази можна перевизначити, щоб тестові запуски не писали в робочу базу
+DATABASE_PATH = os.environ.get("MAFIA_DATABASE_PATH", "./mafia.db")
+DATABASE_URL = f'sqlite:///{DATABASE_PATH}'
+ASYNC_DATABASE_URL = f'sqlite+aiosqlite:///{DATABASE_PATH}'
+# Ключ підпису токенів. Усі воркери мають брати той самий ключ з MAFIA_SECRET_KEY,
+# інакше токен, виданий одним воркером, не пройде перевірку на іншому
+SECRET_KEY = os.environ.get("MAFIA_SECRET_KEY") or os.urandom(32)
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 
 
 UPLOAD_FOLDER = "static/products/"
@@ -9,4 +15,76 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 MAX_CONTENT_LENGTH = 2 * 1024 * 1024
 ALLOWED_EXTENTIONS = {"png", "jpg", "jpeg", "gif"}
 
-ALGORITHM = "HS256"
\ No newline at end of file
+ALGORITHM = "HS256"
+
+# Розсилка повідомлень у кімнаті
+BROADCAST_FANOUT = True  # окрема черга і задача відправки для кожного гравця
+BROADCAST_SEND_TIMEOUT = 2.0  # секунд на одну відправку, після чого клієнт відключається
+BROADCAST_QUEUE_SIZE = 64  # максимум повідомлень у черзі одного гравця
+
+# Фоновий запис повідомлень чату
+CHAT_FLUSH_BATCH_SIZE = 100  # скидати в базу, щойно назбиралось стільки повідомлень
+CHAT_FLUSH_INTERVAL = 0.5  # або не рідше ніж раз на стільки секунд
+CHAT_QUEUE_SIZE = 10000  # максимум повідомлень, що чекають на запис
+
+# Хешування паролів
+BCRYPT_ROUNDS = 12  # вартість bcrypt; старі хеші перехешовуються під час входу
+BCRYPT_WORKERS = os.cpu_count() or 1  # потоків для bcrypt поза event loop
+BCRYPT_MAX_PENDING = 64  # скільки хешувань може чекати в черзі, далі 503
+
+# Кеш користувачів для автентифікації
+USER_CACHE_TTL = 60  # секунд, після яких знімок користувача перечитується з бази
+USER_CACHE_SIZE = 10000  # максимум користувачів у кеші
+
+# Історія чату
+MESSAGES_PAGE_SIZE = 50
+MESSAGES_PAGE_MAX = 200
+
+# Список кімнат у лобі
+LOBBY_PAGE_SIZE = 50
+LOBBY_PAGE_MAX = 200
+
+# Реєстр кімнат між воркерами
+# "local" - один воркер, "redis" - кілька воркерів, кімната живе на одному з них
+ROOM_REGISTRY_BACKEND = os.environ.get("MAFIA_ROOM_REGISTRY", "local")
+REDIS_URL = os.environ.get("MAFIA_REDIS_URL", "redis://localhost:6379/0")
+# Адреса websocket цього воркера, напр. "wss://w1.example.com". Клієнт чужої кімнати
+# закривається з кодом 4010 і цією адресою власника в reason, за нею він і перепідключається
+WORKER_URL = os.environ.get("MAFIA_WORKER_URL", "")
+WORKER_ID = WORKER_URL or f"{socket.gethostname()}:{os.getpid()}"
+ROOM_OWNERSHIP_TTL = 60  # секунд оренди власності кімнати; власник продовжує її кожну третину строку
+
+# Знімки стану ігор для відновлення після рестарту
+SNAPSHOT_DIR = os.environ.get("MAFIA_SNAPSHOT_DIR", "snapshots/")
+
+# Логування
+LOG_LEVEL = "INFO"  # DEBUG вмикає події на кожне повідомлення websocket
+LOG_SAMPLE_RATE = 20  # подій на секунду для однієї частої події, решта лише підраховується
+
+# Метрики Prometheus на /metrics
+METRICS_DB_TIMINGS = True  # заміри кожного SQL-запиту через події SQLAlchemy
+
+# Повідомлення websocket
+CHAT_MESSAGE_MAX_LENGTH = 2000  # довші повідомлення чату відхиляються ще до обробника
+
+# Тривалість фаз гри; після дедлайну фаза завершується з тими діями, що вже є (0 - без дедлайну)
+NIGHT_PHASE_SECONDS = 60
+DAY_PHASE_SECONDS = 120
+
+# Перевірка живості з'єднань і прибирання покинутих кімнат
+HEARTBEAT_INTERVAL = 20  # секунд між ping від сервера; клієнт відповідає pong
+HEARTBEAT_TIMEOUT = 60  # з'єднання без жодного кадру від клієнта довше за це вважається мертвим
+ROOM_IDLE_GRACE = 300  # секунд без підключених гравців, після яких кімната знімається з пам'яті
+
+# Обмеження вхідних кадрів websocket: тип -> (кадрів за секунду, запас); тип без запису не обмежується
+PLAYER_RATE_LIMITS = {"*": (20, 40), "chat": (1, 5), "sync": (2, 10)}  # одне з'єднання; "*" - усі кадри разом
+ROOM_RATE_LIMITS = {"chat": (5, 20)}  # усі гравці кімнати разом
+WORKER_RATE_LIMITS = {"chat": (500, 1000)}  # усі кімнати воркера разом
+RATE_LIMIT_MAX_STRIKES = 100  # відкинутих кадрів поспіль, після яких з'єднання закривається
+
+# Кодування кадрів websocket гри, яке клієнт обирає в рукостисканні: ?encoding=msgpack&compress=deflate.
+# permessage-deflate самого з'єднання вмикає сервер ASGI (uvicorn --ws-per-message-deflate)
+WS_ENCODINGS = ("json", "msgpack")  # msgpack доступний, якщо встановлено пакет msgpack
+WS_COMPRESSION = True  # дозволити клієнтам compress=deflate
+WS_COMPRESSION_LEVEL = 6
+WS_MAX_INFLATED_SIZE = 64 * 1024  # більший розпакований вхідний кадр відкидається
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime
+from sqlalchemy import insert
+from app.database import AsyncSessionLocal
+from app.models import Messages
+from app.log import get_logger
+from app.config import CHAT_FLUSH_BATCH_SIZE, CHAT_FLUSH_INTERVAL, CHAT_QUEUE_SIZE
+
+log = get_logger("chat_writer")
+
+# Маркер зупинки для фонової задачі
+_STOP = object()
+
+
+# Записує повідомлення чату в базу пачками у фоні, щоб розсилка не чекала на диск
+class ChatWriter:
+    def __init__(self, batch_size=CHAT_FLUSH_BATCH_SIZE, flush_interval=CHAT_FLUSH_INTERVAL, max_queue=CHAT_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.queue = None
+        self.task = None
+        # Після stop нові повідомлення не приймаються: їх би вже ніхто не записав
+        self.closed = False
+
+    def start(self):
+        if self.task is not None:
+            return
+        self.closed = False
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.task = asyncio.create_task(self._run())
+        log.info("chat writer started")
+
+    async def stop(self):
+        """Записує все, що лишилось у черзі, і зупиняє фонову задачу"""
+        self.closed = True
+        if self.task is None:
+            return
+        await self.queue.put(_STOP)
+        await self.task
+        self.task = None
+        self.queue = None
+        log.info("chat writer stopped")
+
+    def submit(self, user_id, room_id, message):
+        if self.closed:
+            log.warning("chat writer is stopped, message dropped", user_id=user_id, room_id=room_id)
+            return
+        if self.task is None:
+            self.start()
+        try:
+            self.queue.put_nowait({
+                "message": message,
+                "user_id": user_id,
+                "room_id": room_id,
+                "writing_time": datetime.now()
+            })
+        except asyncio.QueueFull:
+            log.warning("chat queue is full, message dropped", user_id=user_id, room_id=room_id)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            # Добираємо пачку до розміру або до дедлайну
+            while len(batch) < self.batch_size:
+                if self.queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self.queue.get_nowait()
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+
+    async def _write(self, batch):
+        async with AsyncSessionLocal() as db:
+            try:
+                await db.execute(insert(Messages), batch)
+                await db.commit()
+            except Exception as e:
+                log.error("error saving chat messages", count=len(batch), error=str(e))
+                await db.rollback()
+
+
+chat_writer = ChatWriter()
@@ -1,47 +1,195 @@
 import asyncio
+import time
+import logging
 import random
+from enum import IntEnum
 from typing import List, Dict
 from sqlalchemy.orm import Session
 from app.models import Room
 from itertools import count
 from fastapi import WebSocket, WebSocketDisconnect
+from app.config import BROADCAST_FANOUT, BROADCAST_SEND_TIMEOUT, BROADCAST_QUEUE_SIZE
+from app.game_rooms.protocol import JSON_CODEC, MessageFrames
+from app.game_rooms.voting import VoteTally
+from app.log import get_logger
+from app.metrics import broadcast_latency, broadcast_recipients, players_dropped, delivery_latency
 
 from websockets import broadcast
 
+log = get_logger("game_models")
+
+
+# Ролі й фази зберігаються як малі цілі; рядок (label) з'являється лише в повідомленнях клієнтам
+class Role(IntEnum):
+    MAFIA = 1
+    DOCTOR = 2
+    DETECTIVE = 3
+    CIVILIAN = 4
+
+    def __init__(self, value):
+        self.label = self.name.lower()
+
+
+class Phase(IntEnum):
+    WAITING = 0
+    NIGHT = 1
+    DAY = 2
+    ENDED = 3
+
+    def __init__(self, value):
+        self.label = self.name.lower()
+
+
+# Ролі, що діють уночі
+NIGHT_ROLES = (Role.MAFIA, Role.DOCTOR, Role.DETECTIVE)
+
+
+# Нічні дії раунду; один запис на кімнату, що очищається між раундами
+class NightActions:
+    __slots__ = ("mafia", "doctor", "detective")
+
+    def __init__(self):
+        self.mafia = {}  # id мафіозі -> id цілі; повторний вибір замінює попередній
+        self.doctor = None
+        self.detective = None
+
+    def clear(self):
+        self.mafia.clear()
+        self.doctor = None
+        self.detective = None
+
+    def record(self, player, target_id):
+        if player.role == Role.MAFIA:
+            self.mafia[player.id] = target_id
+        elif player.role == Role.DOCTOR:
+            self.doctor = target_id
+        elif player.role == Role.DETECTIVE:
+            self.detective = target_id
+
+    def mafia_victim(self):
+        """Ціль, за яку проголосувало найбільше мафіозі, або None"""
+        if not self.mafia:
+            return None
+        targets = list(self.mafia.values())
+        return max(set(targets), key=targets.count)
+
 # Клас гравця, що представляє окремого користувача в грі
 class Player:
-    def __init__(self, id, name, websocket):
+    __slots__ = ("id", "name", "websocket", "codec", "is_ready", "is_alive", "role",
+                 "outbox", "sender_task", "close_task", "is_connected")
+
+    def __init__(self, id, name, websocket, codec=JSON_CODEC):
         self.id = id
         self.name = name
         self.websocket = websocket
+        self.codec = codec  # кодування кадрів, обране клієнтом під час підключення
         self.is_ready = False
         self.is_alive = True
         self.role = None
-        self.vote = None
-        self.night_action = None
-        print(f"Created player {id} with name {name}")
+        # Черга вихідних повідомлень і задача, що їх відправляє
+        self.outbox = None
+        self.sender_task = None
+        self.close_task = None
+        self.is_connected = True
+        log.debug("player created", player_id=id, name=name)
 
-    def to_dict(self):
+    def to_dict(self, show_role=True):
         return {
             "id": self.id,
             "name": self.name,
             "username": self.name,
             "is_ready": self.is_ready,
             "is_alive": self.is_alive,
-            "role": self.role,
+            "role": self.role_label if show_role else None,
             "is_owner": False  # Буде встановлено в GameRoom
         }
     
+    @property
+    def role_label(self):
+        return self.role.label if self.role is not None else None
+
     def reset(self):
         self.is_ready = False
         self.is_alive = True
         self.role = None
-        self.vote = None
-        self.night_action = None
-        print(f"Reset player {self.id} state")
+        log.debug("player reset", player_id=self.id)
+
+    async def send(self, message):
+        """Відправка повідомлення гравцю, не чекаючи повільного клієнта"""
+        await self.send_frame(self.codec.encode(message))
+
+    async def send_frame(self, frame):
+        """Відправка вже закодованого кадру: str - текстовий, bytes - двійковий"""
+        if not BROADCAST_FANOUT:
+            with delivery_latency.time():
+                await self._send_raw(frame)
+            return
+        if not self.is_connected:
+            return
+        if self.sender_task is None:
+            self.outbox = asyncio.Queue(maxsize=BROADCAST_QUEUE_SIZE)
+            self.sender_task = asyncio.create_task(self._sender())
+        try:
+            # Час постановки в чергу, щоб міряти доставку разом з очікуванням у черзі
+            self.outbox.put_nowait((frame, time.perf_counter()))
+        except asyncio.QueueFull:
+            log.warning("outbox full, dropping connection", player_id=self.id)
+            self.drop()
+
+    async def _sender(self):
+        # stop_sender скасовує задачу, але wait_for може проковтнути cancel(), якщо відправка
+        # саме завершилась; тоді задача не має читати далі, бо self.outbox уже None.
+        # Тому задача тримає свою чергу і зупиняється, щойно її від'єднали
+        outbox = self.outbox
+        while self.outbox is outbox:
+            frame, queued = await outbox.get()
+            try:
+                await asyncio.wait_for(self._send_raw(frame), BROADCAST_SEND_TIMEOUT)
+                delivery_latency.observe(time.perf_counter() - queued)
+            except asyncio.TimeoutError:
+                log.warning("send timed out, dropping connection", player_id=self.id)
+                self.drop()
+                return
+            except Exception as e:
+                log.warning("send failed, dropping connection", player_id=self.id, error=str(e))
+                self.drop()
+                return
+
+    def _send_raw(self, frame):
+        if isinstance(frame, bytes):
+            return self.websocket.send_bytes(frame)
+        return self.websocket.send_text(frame)
+
+    def stop_sender(self):
+        if self.sender_task is not None and self.sender_task is not asyncio.current_task():
+            self.sender_task.cancel()
+        self.sender_task = None
+        self.outbox = None
+
+    def drop(self, code=1008):
+        """Відключає повільного або мертвого клієнта, не блокуючи розсилку"""
+        if not self.is_connected:
+            return
+        self.is_connected = False
+        players_dropped.inc()
+        self.stop_sender()
+        self.close_task = asyncio.create_task(close_websocket(self.websocket, code))
+
+
+async def close_websocket(websocket, code):
+    """Закриває сокет, не чекаючи клієнта довше за BROADCAST_SEND_TIMEOUT"""
+    try:
+        await asyncio.wait_for(websocket.close(code=code), BROADCAST_SEND_TIMEOUT)
+    except Exception:
+        pass
         
 # Клас кімнати гри
 class GameRoom:
+    __slots__ = ("id", "name", "owner", "min_players", "max_players", "players",
+                 "by_role", "alive", "alive_mafia", "alive_town",
+                 "phase", "round", "is_game_over", "night_actions", "votes",
+                 "resolving", "rate_buckets", "version")
+
     def __init__(self, id, name, owner_id, min_players=6, max_players=10):
         self.id = id
         self.name = name
@@ -49,134 +197,235 @@ class GameRoom:
         self.min_players = min_players
         self.max_players = max_players
         self.players = {}
-        self.phase = "waiting"  # waiting, night, day
+        # Індекси гравців для пошуку за O(1); змінюються лише через методи кімнати
+        self.by_role = {}  # роль -> {id: гравець}
+        self.alive = {}  # id -> живий гравець
+        # Лічильники живих для перевірки перемоги за O(1)
+        self.alive_mafia = 0
+        self.alive_town = 0
+        self.phase = Phase.WAITING
         self.round = 0
         self.is_game_over = False
-        self.night_actions = {
-            "mafia": [],
-            "doctor": None,
-            "detective": None
-        }
-        self.votes = {}
-        print(f"Created game room {id} with name {name}")
+        self.night_actions = NightActions()
+        self.votes = VoteTally()
+        # Фаза саме розв'язується; захищає від повторного розв'язання з дедлайну і від гравців
+        self.resolving = False
+        # Відра лімітів вхідних кадрів, спільні для всіх гравців кімнати
+        self.rate_buckets = {}
+        # Лічильник версій стану: кожна дельта, що розсилається гравцям, збільшує його на 1
+        self.version = 0
+        log.info("room created", room_id=id, name=name)
 
     def add_player(self, player):
+        # Гравець, що вже в кімнаті, повертається лише через reconnect
+        if player.id in self.players:
+            log.info("player already in room", room_id=self.id, player_id=player.id)
+            return False
         if len(self.players) >= self.max_players:
-            print(f"Cannot add player {player.id}: room is full")
+            log.info("room is full", room_id=self.id, player_id=player.id)
             return False
         self.players[player.id] = player
-        print(f"Added player {player.id} to room {self.id}")
+        if player.role is not None:
+            self.by_role.setdefault(player.role, {})[player.id] = player
+        if player.is_alive:
+            self.alive[player.id] = player
+            self._count_alive(player, 1)
+        self.version += 1
+        log.info("player added", room_id=self.id, player_id=player.id)
         return True
 
     def remove_player(self, player_id):
         if player_id in self.players:
-            del self.players[player_id]
+            player = self.players.pop(player_id)
+            player.stop_sender()
+            # Пізня відправка вибулому гравцю не має створити нову задачу відправки
+            player.is_connected = False
+            self.by_role.get(player.role, {}).pop(player_id, None)
+            if self.alive.pop(player_id, None) is not None:
+                self._count_alive(player, -1)
+            self.votes.retract(player_id)
+            self._withdraw_votes_for(player_id)
+            self.version += 1
             if self.owner == player_id and self.players:
                 self.owner = next(iter(self.players))
-                print(f"New owner is {self.owner}")
-            print(f"Removed player {player_id} from room {self.id}")
+                log.info("owner changed", room_id=self.id, owner=self.owner)
+            log.info("player removed", room_id=self.id, player_id=player_id)
             return True
         return False
     
+    def _withdraw_votes_for(self, player_id):
+        # Голоси за гравця, якого вже не можна стратити, не мають вирішувати день
+        for voter_id in self.votes.drop_target(player_id):
+            voter = self.players.get(voter_id)
+            if voter is not None:
+                voter.is_ready = False
+
     def get_player(self, player_id):
         return self.players.get(player_id)
+
+    def players_with_role(self, role):
+        """Гравці з роллю в порядку входу до кімнати"""
+        return self.by_role.get(role, {}).values()
+
+    def player_with_role(self, role):
+        return next(iter(self.players_with_role(role)), None)
+
+    def set_role(self, player, role):
+        self.by_role.get(player.role, {}).pop(player.id, None)
+        if player.is_alive:
+            self._count_alive(player, -1)
+        player.role = role
+        if role is not None:
+            self.by_role.setdefault(role, {})[player.id] = player
+        if player.is_alive:
+            self._count_alive(player, 1)
+
+    def _count_alive(self, player, delta):
+        # Гравець без ролі (гра ще не почалась) у лічильниках не бере участі
+        if player.role == Role.MAFIA:
+            self.alive_mafia += delta
+        elif player.role is not None:
+            self.alive_town += delta
+
+    def _recount_alive(self):
+        self.alive_mafia = 0
+        self.alive_town = 0
+        for player in self.alive.values():
+            self._count_alive(player, 1)
+
+    def reconnect(self, player, websocket):
+        """Переводить гравця на нове з'єднання: після відновлення зі знімка
+        або коли клієнт перепідключився раніше, ніж сервер помітив розрив старого"""
+        stale = player.websocket
+        # Кадри в черзі старого з'єднання вже неактуальні: новий клієнт отримає повний стан
+        player.stop_sender()
+        player.websocket = websocket
+        player.is_connected = True
+        if stale is not None and stale is not websocket:
+            player.close_task = asyncio.create_task(close_websocket(stale, 4009))
+        self.version += 1
+        log.info("player reconnected", room_id=self.id, player_id=player.id)
+
+    def toggle_ready(self, player):
+        player.is_ready = not player.is_ready
+        self.version += 1
+        return player.is_ready
     
-    def to_dict(self):
+    @property
+    def roles_hidden(self):
+        """Поки гра триває, ролі інших гравців нікому не показуються"""
+        return self.phase in (Phase.NIGHT, Phase.DAY)
+
+    def player_dict(self, player, viewer_id=None):
+        """Гравець для розсилки; роль видно лише йому самому, поки гра триває"""
+        return player.to_dict(show_role=not self.roles_hidden or player.id == viewer_id)
+
+    def to_dict(self, viewer_id=None):
+        """Стан кімнати очима гравця viewer_id"""
         return {
             "id": self.id,
             "name": self.name,
             "owner": self.owner,
             "min_players": self.min_players,
             "max_players": self.max_players,
-            "phase": self.phase,
+            "phase": self.phase.label,
             "round": self.round,
             "is_game_over": self.is_game_over,
-            "players": [p.to_dict() for p in self.players.values()]
+            "version": self.version,
+            "players": [self.player_dict(p, viewer_id) for p in self.players.values()]
         }
 
     async def broadcast(self, message):
-        print(f"Broadcasting message to {len(self.players)} players in room {self.id}")
-        for player in self.players.values():
+        log.sampled(logging.DEBUG, "broadcast", room_id=self.id, recipients=len(self.players))
+        # Кодуємо один раз на кодування, гравці з тим самим кодеком отримують той самий кадр
+        frames = MessageFrames(message)
+        with broadcast_latency.time():
+            await self.deliver(frames)
+        broadcast_recipients.observe(len(self.players))
+
+    async def deliver(self, frames: MessageFrames):
+        """Розсилка повідомлення гравцям кімнати, кожному в його кодуванні"""
+        # Гравець може бути видалений під час розсилки, тому ітеруємо по копії
+        for player in list(self.players.values()):
             try:
-                await player.websocket.send_json(message)
+                await player.send_frame(frames.encode(player.codec))
             except Exception as e:
-                print(f"Error broadcasting to player {player.id}: {str(e)}")
+                log.warning("broadcast to player failed", room_id=self.id, player_id=player.id, error=str(e))
     
     def check_victory(self):
-        if not self.is_game_over:
-            mafia_count = sum(1 for p in self.players.values() if p.is_alive and p.role == "mafia")
-            civilians_count = sum(1 for p in self.players.values() if p.is_alive and p.role != "mafia")
-            
-            print(f"Victory check: mafia={mafia_count}, civilians={civilians_count}")
-            
-            if mafia_count == 0:
-                return "civilians"
-            elif mafia_count >= civilians_count:
-                return "mafia"
+        """Переможець ("mafia" або "citizens") або None, поки гра триває"""
+        if self.is_game_over:
+            return None
+        log.debug("victory check", room_id=self.id, mafia=self.alive_mafia, citizens=self.alive_town)
+        if self.alive_mafia == 0:
+            return "citizens"
+        if self.alive_mafia >= self.alive_town:
+            return "mafia"
         return None
 
     def can_start_game(self) -> bool:
-        print(f"Checking if game can start in room {self.id}:")
-        print(f"- Phase: {self.phase}")
-        print(f"- Players count: {len(self.players)}")
-        print(f"- Min players required: {self.min_players}")
-        print(f"- All players ready: {all(player.is_ready for player in self.players.values())}")
+        log.debug("start check", room_id=self.id, phase=self.phase.label, players=len(self.players), min_players=self.min_players)
         
-        if self.phase != "waiting":
-            print("Game cannot start: wrong phase")
+        if self.phase != Phase.WAITING:
+            log.debug("game cannot start", room_id=self.id, reason="wrong phase")
             return False
         if len(self.players) < self.min_players:
-            print("Game cannot start: not enough players")
+            log.debug("game cannot start", room_id=self.id, reason="not enough players")
             return False
         if not all(player.is_ready for player in self.players.values()):
-            print("Game cannot start: not all players are ready")
+            log.debug("game cannot start", room_id=self.id, reason="not all players are ready")
             return False
-        print("Game can start!")
         return True
 
     def start_game(self):
-        print(f"Starting game in room {self.id}...")
+        log.info("starting game", room_id=self.id)
         if not self.can_start_game():
-            print("Cannot start game: conditions not met")
+            log.info("cannot start game", room_id=self.id)
             raise ValueError("Cannot start game: conditions not met")
         
-        print("Setting game state...")
-        self.phase = "night"  # Починаємо з ночі
+        self.phase = Phase.NIGHT  # Починаємо з ночі
         self.round = 1
         self.is_game_over = False
-        self.night_actions = {
-            "mafia": [],
-            "doctor": None,
-            "detective": None
-        }
-        self.votes = {}
+        self.night_actions.clear()
+        self.votes.clear()
         
-        print("Assigning roles...")
         self.assign_roles()
+        self.reset_players()
+        self.version += 1
         
-        print("Resetting player states...")
+        log.info("game started", room_id=self.id)
+
+    def reset_players(self):
+        """Усі гравці знову живі й не готові"""
         for player in self.players.values():
             player.is_ready = False
             player.is_alive = True
-            print(f"Player {player.id} ({player.name}): role={player.role}, is_alive={player.is_alive}")
-        
-        print(f"Game started in room {self.id}")
+            log.debug("player state", room_id=self.id, player_id=player.id, role=player.role_label, is_alive=player.is_alive)
+        self.alive = dict(self.players)
+        self._recount_alive()
 
     def assign_roles(self):
-        print(f"Assigning roles in room {self.id}...")
-        roles = ["mafia", "mafia", "doctor", "detective", "civilian", "civilian"]
+        roles = [Role.MAFIA, Role.MAFIA, Role.DOCTOR, Role.DETECTIVE, Role.CIVILIAN, Role.CIVILIAN]
+        # Гравці понад шістьох теж отримують роль, а не лишаються без неї
+        roles += [Role.CIVILIAN] * (len(self.players) - len(roles))
         random.shuffle(roles)
         
-        players_list = list(self.players.values())
-        for player, role in zip(players_list, roles):
+        self.by_role = {}
+        for player, role in zip(self.players.values(), roles):
             player.role = role
-            print(f"Assigned role {role} to player {player.id} ({player.name})")
+            self.by_role.setdefault(role, {})[player.id] = player
+            log.debug("role assigned", room_id=self.id, player_id=player.id, role=role.label)
+        self._recount_alive()
 
     def kill_player(self, player_id):
         player = self.get_player(player_id)
         if player:
+            if self.alive.pop(player_id, None) is not None:
+                self._count_alive(player, -1)
             player.is_alive = False
-            print(f"Player {player_id} was killed")
+            self.votes.retract(player_id)
+            self._withdraw_votes_for(player_id)
+            log.info("player killed", room_id=self.id, player_id=player_id)
             return True
         return False
 
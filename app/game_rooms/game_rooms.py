@@ -1,54 +1,67 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, status, Depends, Query
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Depends, Query
 from fastapi.websockets import WebSocketState
-import json
-from app.database import get_db
+import logging
+from app.database import get_async_db, AsyncSessionLocal
 from app.models import Messages, User, Room
-from sqlalchemy.orm import Session
-from jose import jwt, JWTError
-from app.auth import  get_user_by_email
-from app.config import SECRET_KEY, ALGORITHM
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from jose import jwt
+from app.auth import load_user_snapshot
+from app.config import SECRET_KEY, ALGORITHM, MESSAGES_PAGE_SIZE, MESSAGES_PAGE_MAX, NIGHT_PHASE_SECONDS, DAY_PHASE_SECONDS, HEARTBEAT_TIMEOUT
 import random, string
-from app.game_rooms.game_models import GameRoom, Player
+from app.game_rooms.game_models import GameRoom, Player, Role, Phase, NIGHT_ROLES
+from app.schemas import ChatMessage, EmptyPayload, NightActionPayload, VotePayload
 from app.game_rooms.room_storage import active_rooms
+from app.game_rooms.chat_writer import chat_writer
+from app.game_rooms.lobby import lobby
+from app.game_rooms.snapshots import snapshot_store
+from app.game_rooms.scheduler import phase_deadlines
+from app.game_rooms.heartbeat import heartbeat
+from app.game_rooms.ratelimit import FrameLimiter
+from app.game_rooms.protocol import negotiate_codec
+from app.leaderboard import record_game_result
+from app.log import get_logger
+from app.metrics import handler_latency, heartbeat_timeouts, frames_throttled
 import asyncio
-from datetime import datetime
-from typing import Dict
+import time
+from typing import Dict, Optional
 
 router = APIRouter(tags=["Rooms"])
+log = get_logger("game_rooms")
 
-# Словник для збереження обробників повідомлень
+# Таблиця обробників повідомлень: тип -> (обробник, модель payload)
 message_handlers = {}
 
-# Помилка автентифікації
-credentials_exception = HTTPException(
-    status_code=status.HTTP_401_UNAUTHORIZED,
-    detail="Не вдалося перевірити облікові дані",
-    headers={"WWW-Authenticate": "Bearer"},
-)
-
-# Декоратор для реєстрації обробників повідомлень за типом
-def register_handler(message_type):
+# Декоратор для реєстрації обробників повідомлень за типом.
+# Обробник викликається як handler(room, player, payload) з уже перевіреним payload
+def register_handler(message_type, payload_model):
     def decorator(func):
-        print(f"Registered handler: {message_type} → {func.__name__}")
-        message_handlers[message_type] = func 
+        log.debug("handler registered", message_type=message_type, handler=func.__name__)
+        message_handlers[message_type] = (func, payload_model)
         return func
     return decorator
 
-# Отримуємо користувача за токеном
-async def get_user_by_token(token: str, db: Session):
-    try:
-        print(f"Decoding token: {token}")
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            print("No email found in token")
-            raise credentials_exception
-        user = get_user_by_email(db, email)
-        print(f"User found: {user}")
-        return user
-    except JWTError as e:
-        print(f"JWT Error: {e}")
-        raise credentials_exception
+# Повний стан кімнати для нового гравця або для ресинхронізації
+def room_state_message(room: GameRoom, viewer: Player):
+    state = room.to_dict(viewer.id)
+    return {
+        "type": "room_state",
+        "room": state,
+        "players": state["players"]
+    }
+
+def mafia_members(room: GameRoom):
+    return [{"id": m.id, "name": m.name} for m in room.players_with_role(Role.MAFIA)]
+
+# Особисте повідомлення гравцю з його роллю; мафія дізнається й спільників
+def role_message(player: Player, mafia):
+    message = {
+        "type": "role_assigned",
+        "role": player.role_label
+    }
+    if player.role == Role.MAFIA:
+        message["other_mafia"] = [m for m in mafia if m["id"] != player.id]
+    return message
 
 # Генеруємо ім'я для гравця-гостя
 def generate_guest_name():
@@ -57,16 +70,25 @@ def generate_guest_name():
 
 # WebSocket підключення до кімнати
 @router.websocket("/ws/room/{room_id}")
-async def websocket_endpoint(websocket: WebSocket, room_id: int, token: str = Query(None), db: Session = Depends(get_db)):
+async def websocket_endpoint(websocket: WebSocket, room_id: int, token: str = Query(None),
+                             encoding: Optional[str] = Query(None), compress: Optional[str] = Query(None)):
     """
-    WebSocket endpoint для кімнати
+    WebSocket endpoint для кімнати; encoding (json, msgpack) і compress (deflate) задають кодування кадрів
     """
     try:
-        print(f"WebSocket connection attempt for room {room_id}")
-        
+        log.debug("connection attempt", room_id=room_id)
+
+        codec = negotiate_codec(encoding, compress)
+        if codec is None:
+            log.info("unsupported encoding", room_id=room_id, encoding=encoding, compress=compress)
+            # Код 4004 доходить до клієнта лише після accept, інакше це просто HTTP 403
+            await websocket.accept()
+            await websocket.close(code=4004)
+            return
+
         # Перевіряємо токен
         if not token:
-            print("No token provided")
+            log.info("connection without token", room_id=room_id)
             await websocket.close(code=4000)
             return
             
@@ -74,233 +96,237 @@ async def websocket_endpoint(websocket: WebSocket, room_id: int, token: str = Qu
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
             user_email = payload.get("sub")
             if not user_email:
-                print("No email in token")
+                log.info("token has no subject", room_id=room_id)
                 await websocket.close(code=4000)
                 return
         except Exception as e:
-            print(f"Token verification error: {str(e)}")
+            log.info("invalid token", room_id=room_id, error=str(e))
             await websocket.close(code=4000)
             return
 
-        # Отримуємо користувача з бази даних
-        user = db.query(User).filter(User.email == user_email).first()
-        if not user:
-            print(f"User not found for email: {user_email}")
-            await websocket.close(code=4000)
+        # Кімнату обслуговує один воркер; інших клієнтів відправляємо до нього.
+        # Закриття до accept стає HTTP 403 без коду і reason, тож спершу приймаємо з'єднання
+        owner = await active_rooms.claim(room_id)
+        if owner != active_rooms.worker_id:
+            log.info("room owned by another worker", room_id=room_id, owner=owner)
+            await websocket.accept()
+            await websocket.close(code=4010, reason=owner)
             return
 
-        # Перевіряємо чи існує кімната в базі даних
-        db_room = db.query(Room).filter(Room.id == room_id).first()
-        if not db_room:
-            print(f"Room {room_id} not found in database")
+        # Користувач береться з кешу, кімната - з active_rooms; база читається лише при промаху
+        room = active_rooms.get(room_id)
+        async with AsyncSessionLocal() as db:
+            user = await load_user_snapshot(db, user_email)
+            db_room = await db.get(Room, room_id) if room is None else None
+
+        if not user:
+            log.info("user not found", room_id=room_id)
+            await release_unused(room_id)
             await websocket.close(code=4000)
             return
 
-        # Перевіряємо чи існує кімната в активних кімнатах
-        room = active_rooms.get(room_id)
-        if not room:
-            # Якщо кімнати немає в active_rooms, створюємо її
-            room = GameRoom(
-                id=db_room.id,
-                name=db_room.name,
-                owner_id=db_room.owner,
-                min_players=db_room.min_players_number,
-                max_players=db_room.max_players_number
-            )
-            active_rooms[room_id] = room
-            print(f"Created new room instance: {room.id}")
+        if room is None:
+            # Перевіряємо чи існує кімната в базі даних
+            if not db_room:
+                log.info("room not found", room_id=room_id)
+                await release_unused(room_id)
+                await websocket.close(code=4000)
+                return
+
+            # Кімнату могли створити, поки ми чекали на базу
+            room = active_rooms.get(room_id)
+            if not room:
+                # Якщо кімнати немає в active_rooms, створюємо її
+                room = GameRoom(
+                    id=db_room.id,
+                    name=db_room.name,
+                    owner_id=db_room.owner,
+                    min_players=db_room.min_players_number,
+                    max_players=db_room.max_players_number
+                )
+                active_rooms[room_id] = room
+                log.info("room instance created", room_id=room.id)
 
         # Приймаємо з'єднання
         await websocket.accept()
-        print(f"WebSocket connection accepted for user {user.id} in room {room_id}")
-
-        # Додаємо гравця до кімнати
-        player = Player(id=user.id, name=user.username, websocket=websocket)
-        if not room.add_player(player):
-            print(f"Cannot add player {user.id} to room {room_id}")
-            await websocket.close(code=4003)
-            return
+        conn_log = log.bind(room_id=room_id, player_id=user.id)
+        conn_log.info("connection accepted", encoding=codec.encoding, compress=codec.compress)
+
+        # Гравець, що вже є в кімнаті (зі знімка або зі старим сокетом), переходить на нове з'єднання
+        player = room.get_player(user.id)
+        if player is not None:
+            player.codec = codec
+            room.reconnect(player, websocket)
+        else:
+            player = Player(id=user.id, name=user.username, websocket=websocket, codec=codec)
+            if not room.add_player(player):
+                conn_log.info("cannot add player")
+                await websocket.close(code=4003)
+                return
+        lobby.sync(room)
 
         # Відправляємо повідомлення про підключення
         await room.broadcast({
             "type": "player_joined",
+            "version": room.version,
             "username": player.name,
-            "players": [p.to_dict() for p in room.players.values()]
+            "player": room.player_dict(player)
         })
 
         # Відправляємо початковий стан кімнати
-        await websocket.send_json({
-            "type": "room_state",
-            "room": room.to_dict(),
-            "players": [p.to_dict() for p in room.players.values()]
-        })
-        print(f"Sent initial room state to player {user.id}")
+        await player.send(room_state_message(room, player))
+        # Гравець, що повернувся в гру, що йде, знову отримує свою роль
+        if player.role is not None and room.phase in (Phase.NIGHT, Phase.DAY):
+            await player.send(role_message(player, mafia_members(room)))
 
+        limiter = FrameLimiter()
         try:
             while True:
-                data = await websocket.receive_json()
-                print(f"Received message from player {user.id}: {data}")
-
-                if data["type"] == "chat":
-                    message = data.get("payload", {}).get("message", "")
-                    if message.strip():
-                        # Відправляємо повідомлення всім гравцям
-                        await room.broadcast({
-                            "type": "chat",
-                            "username": player.name,
-                            "message": message
-                        })
-                        
-                        # Зберігаємо повідомлення в базі даних
-                        new_message = Messages(
-                            message=message,
-                            user_id=player.id,
-                            room_id=room.id
-                        )
-                        db.add(new_message)
-                        db.commit()
-                        print(f"Chat message saved: {message}")
-
-                elif data["type"] == "toggle_ready":
-                    player.is_ready = not player.is_ready
-                    print(f"Player {user.id} ready state changed to {player.is_ready}")
-                    
-                    # Перевіряємо загальний стан готовності
-                    all_ready = all(p.is_ready for p in room.players.values())
-                    print(f"All players ready: {all_ready}")
-                    
-                    # Відправляємо оновлений стан всім гравцям
-                    await room.broadcast({
-                        "type": "player_ready",
-                        "player_id": player.id,
-                        "is_ready": player.is_ready,
-                        "players": [p.to_dict() for p in room.players.values()]
-                    })
-                    
-                    # Відправляємо додаткове повідомлення про загальний стан готовності
-                    if all_ready:
-                        await room.broadcast({
-                            "type": "system",
-                            "message": "Всі гравці готові до початку гри!"
-                        })
-
-                elif data["type"] == "start_game":
-                    print(f"Start game request from player {player.id}")
-                    if player.id != room.owner:
-                        print(f"Player {player.id} is not the owner (owner is {room.owner})")
-                        await websocket.send_json({
-                            "type": "error",
-                            "message": "Тільки власник кімнати може почати гру"
-                        })
-                        continue
-
-                    if not room.can_start_game():
-                        print("Game cannot start: conditions not met")
-                        await websocket.send_json({
-                            "type": "error",
-                            "message": "Не всі гравці готові або недостатньо гравців"
-                        })
-                        continue
-
-                    try:
-                        print("Starting game...")
-                        room.start_game()
-                        print("Game started successfully")
-                        
-                        # Відправляємо ролі гравцям
-                        for p in room.players.values():
-                            role_info = {
-                                "type": "role_assigned",
-                                "role": p.role
-                            }
-                            
-                            if p.role == "mafia":
-                                other_mafia = [
-                                    {"id": m.id, "name": m.name}
-                                    for m in room.players.values()
-                                    if m.role == "mafia" and m.id != p.id
-                                ]
-                                role_info["other_mafia"] = other_mafia
-                            
-                            await p.websocket.send_json(role_info)
-                            print(f"Sent role info to player {p.id}")
-                        
-                        # Відправляємо оновлений стан кімнати
-                        await room.broadcast({
-                            "type": "game_started",
-                            "phase": room.phase,
-                            "round": room.round,
-                            "players": [p.to_dict() for p in room.players.values()]
-                        })
-                        
-                        # Відправляємо повідомлення про нічну фазу
-                        await room.broadcast({
-                            "type": "phase_change",
-                            "phase": "night",
-                            "round": 1
-                        })
-                        
-                        print(f"Game state broadcasted to all players")
-                    except Exception as e:
-                        print(f"Error starting game: {str(e)}")
-                        await websocket.send_json({
-                            "type": "error",
-                            "message": f"Помилка при запуску гри: {str(e)}"
-                        })
+                # Клієнт відповідає на ping, тож мовчання довше за HEARTBEAT_TIMEOUT - мертве з'єднання
+                try:
+                    raw = await asyncio.wait_for(receive_frame(websocket), HEARTBEAT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    if player.websocket is websocket:
+                        conn_log.info("heartbeat timed out")
+                        heartbeat_timeouts.inc()
+                        player.drop(code=4008)
+                    break
+
+                # Гравець перепідключився новим з'єднанням, це вже закрито
+                if player.websocket is not websocket:
+                    break
+
+                # Флуд відкидаємо ще до розбору кадру
+                if limiter.check_frame() is not None:
+                    if await throttle(player, limiter, "*", "player"):
+                        break
+                    continue
+
+                # Невідомі й зіпсовані кадри відкидаємо ще до роботи обробника
+                try:
+                    data = player.codec.decode(raw)
+                    handler, payload_model = message_handlers[data["type"]]
+                    payload = payload_model.model_validate(data.get("payload") or {})
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    conn_log.sampled(logging.INFO, "frame rejected")
+                    await send_error(player, "Невірне або невідоме повідомлення")
+                    continue
+
+                message_type = data["type"]
+                scope = limiter.check_message(message_type, room.rate_buckets)
+                if scope is not None:
+                    if await throttle(player, limiter, message_type, scope):
+                        conn_log.info("flooding connection closed", message_type=message_type)
+                        break
+                    continue
+                limiter.accept()
+
+                conn_log.sampled(logging.DEBUG, "frame received", message_type=message_type)
+                # Час обробки кадру потрапляє в гістограму /metrics
+                started = time.perf_counter()
+                try:
+                    await handler(room, player, payload)
+                except Exception as e:
+                    conn_log.error("handler failed", message_type=message_type, exc_info=True)
+                    await send_error(player, f"Помилка обробки повідомлення: {str(e)}")
+                finally:
+                    handler_latency.observe(time.perf_counter() - started, message_type)
 
         except WebSocketDisconnect:
-            print(f"WebSocket disconnected for player {user.id}")
-            room.remove_player(player.id)
-            if not room.players:
-                del active_rooms[room_id]
-                print(f"Room {room_id} deleted as it's empty")
+            conn_log.info("disconnected")
+        finally:
+            # Старе з'єднання гравця, що вже перепідключився, нічого не прибирає
+            if room.players.get(player.id) is player and player.websocket is websocket:
+                await leave_room(room, player, conn_log)
             else:
-                await room.broadcast({
-                    "type": "player_left",
-                    "username": player.name,
-                    "players": [p.to_dict() for p in room.players.values()]
-                })
-                print(f"Player {user.id} removed from room {room_id}")
+                conn_log.info("stale connection closed")
 
     except Exception as e:
-        print(f"Error in WebSocket connection: {str(e)}")
+        log.error("websocket connection error", room_id=room_id, error=str(e))
         try:
             if websocket.client_state.CONNECTED:
                 await websocket.close(code=1011)
         except Exception:
             pass
 
-# Перевірка, чи існує кімната
-async def verify_room(websocket, room_id):
-    
-    room = active_rooms.get(room_id)
-    
-    if not room:
-        await websocket.send_json({
-            "type": "error",
-            "message": "Кімната не знайдена"
-        })
-        return
-
-    return room
-        
-# Обробка чату   
-@register_handler("chat")
-async def handle_chat(websocket: WebSocket, payload: dict, room_id: int, db: Session):
-    room = await verify_room(websocket=websocket, room_id=room_id)
-    if not room:
-        return
-
-    # Знаходимо гравця за WebSocket
-    player = next((p for p in room.players.values() if p.websocket == websocket), None)
-    if not player:
-        await websocket.send_json({
-            "type": "error",
-            "message": "Гравець не знайдений"
-        })
+async def receive_frame(websocket: WebSocket):
+    """Наступний кадр клієнта: str для текстового, bytes для двійкового"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    text = message.get("text")
+    return text if text is not None else message.get("bytes")
+
+async def leave_room(room: GameRoom, player: Player, conn_log):
+    """Прибирає гравця після розриву його з'єднання, зокрема відключеного розсилкою"""
+    room.remove_player(player.id)
+    lobby.sync(room)
+    if not room.players:
+        await discard_room(room)
+        conn_log.info("room deleted as it is empty")
         return
+    await room.broadcast({
+        "type": "player_left",
+        "version": room.version,
+        "player_id": player.id,
+        "username": player.name,
+        "owner": room.owner
+    })
+    conn_log.info("player left")
+    # Вихід гравця посеред гри може вирішити її результат
+    if room.phase in (Phase.NIGHT, Phase.DAY):
+        winner = room.check_victory()
+        if winner:
+            await finish_game(room, winner)
+        elif room.phase == Phase.DAY and room.votes.is_decided(len(room.alive)):
+            await resolve_day(room)
+
+async def discard_room(room: GameRoom):
+    """Знімає з пам'яті кімнату без гравців або покинуту всіма; рядок у базі лишається"""
+    if active_rooms.get(room.id) is room:
+        active_rooms.pop(room.id)
+    phase_deadlines.cancel(room.id)
+    snapshot_store.delete(room.id)
+    # Наступне підключення створить кімнату заново, вже в очікуванні гравців
+    lobby.reset(room.id)
+    await active_rooms.release(room.id)
+
+heartbeat.reaper = discard_room
+
+async def release_unused(room_id):
+    """Віддає власність кімнати, за якою підключення не дійшло до створення GameRoom"""
+    # Кімнату могло створити інше підключення, поки це чекало на базу
+    if room_id not in active_rooms:
+        await active_rooms.release(room_id)
+
+async def send_error(player, message):
+    await player.send({
+        "type": "error",
+        "message": message
+    })
 
-    message = payload.get("message", "")
+# Відповідь на відкинутий кадр за рівнем ліміту, що відмовив
+THROTTLE_ERRORS = {
+    "player": "Забагато повідомлень, зачекайте",
+    "room": "У кімнаті забагато повідомлень, зачекайте",
+    "worker": "Сервер перевантажений, зачекайте",
+}
+
+async def throttle(player, limiter, message_type, scope):
+    """Рахує відкинутий кадр; True, якщо з'єднання закрито за флуд"""
+    frames_throttled.inc(message_type, scope)
+    warn, drop = limiter.reject(scope)
+    if warn:
+        await send_error(player, THROTTLE_ERRORS[scope])
+    if drop:
+        player.drop(code=1008)
+        return True
+    return False
+
+# Обробка чату
+@register_handler("chat", ChatMessage)
+async def handle_chat(room: GameRoom, player: Player, payload: ChatMessage):
+    message = payload.message
     if not message.strip():
         return
 
@@ -311,505 +337,316 @@ async def handle_chat(websocket: WebSocket, payload: dict, room_id: int, db: Ses
         "message": message
     })
 
-    # Зберігаємо повідомлення в базі даних
-    if player.id:  # Тільки для авторизованих користувачів
-        new_message = Messages(
-            message=message,
-            user_id=player.id,
-            room_id=room.id
-        )
-        db.add(new_message)
-        db.commit()
-    
-# Обробка початку гри
-@register_handler("start_game")
-async def handler_start_game(websocket, payload, room_id, **kwargs):
-    room = await verify_room(websocket=websocket, room_id=room_id)
-    if not room:
-        return
-    
-    player = next((p for p in room.players.values() if p.websocket == websocket), None)
-    if not player:
-        await websocket.send_json({
-            "type": "error",
-            "message": "Гравець не знайдений"
-        })
-        return
+    # Зберігаємо повідомлення в базі даних у фоні
+    chat_writer.submit(player.id, room.id, message)
 
-    if room.owner != player.id:
-        await websocket.send_json({
-            "type": "error",
-            "message": "Тільки власник кімнати може почати гру"
-        })
-        return
+# Відповідь на ping; сам кадр уже продовжив життя з'єднання
+@register_handler("pong", EmptyPayload)
+async def handle_pong(room: GameRoom, player: Player, payload: EmptyPayload):
+    pass
 
-    if len(room.players) < room.min_players:
-        await websocket.send_json({
-            "type": "error",
-            "message": f"Для початку гри потрібно щонайменше {room.min_players} гравців"
-        })
-        return
-    
-    if room.phase != "waiting":
-        await websocket.send_json({
-            "type": "error",
-            "message": "Гра вже розпочата"
-        })
-        return
-    
-    # Перевіряємо готовність всіх гравців
+# Клієнт помітив пропущену версію і просить повний стан
+@register_handler("sync", EmptyPayload)
+async def handle_sync(room: GameRoom, player: Player, payload: EmptyPayload):
+    await player.send(room_state_message(room, player))
+
+@register_handler("toggle_ready", EmptyPayload)
+async def handle_toggle_ready(room: GameRoom, player: Player, payload: EmptyPayload):
+    room.toggle_ready(player)
+    log.debug("ready state changed", room_id=room.id, player_id=player.id, is_ready=player.is_ready)
+
+    # Перевіряємо загальний стан готовності
     all_ready = all(p.is_ready for p in room.players.values())
-    print(f"Checking if all players are ready: {all_ready}")
-    print(f"Players ready states: {[(p.id, p.is_ready) for p in room.players.values()]}")
-    
-    if not all_ready:
-        await websocket.send_json({
-            "type": "error",
-            "message": "Не всі гравці готові"
-        })
-        return
-    
-    try:
-        print("Starting game...")
-        room.phase = "night"  # Починаємо з ночі
-        room.round = 1
-        room.is_game_over = False
-        room.night_actions = {
-            "mafia": [],
-            "doctor": None,
-            "detective": None
-        }
-        room.votes = {}
-        
-        # Роздаємо ролі
-        roles = ["mafia", "mafia", "doctor", "detective", "civilian", "civilian"]
-        random.shuffle(roles)
-        
-        # Спочатку роздаємо ролі всім гравцям
-        for player, role in zip(room.players.values(), roles):
-            player.role = role
-            player.is_ready = False
-            player.is_alive = True
-            print(f"Assigned role {role} to player {player.id}")
-        
-        # Потім відправляємо інформацію про ролі
-        for player in room.players.values():
-            role_info = {
-                    "type": "role_assigned",
-                    "role": player.role
-            }
-            
-            if player.role == "mafia":
-                other_mafia = [
-                    {"id": p.id, "name": p.name}
-                    for p in room.players.values()
-                    if p.role == "mafia" and p.id != player.id
-                ]
-                role_info["other_mafia"] = other_mafia
-            
-            await player.websocket.send_json(role_info)
-            print(f"Sent role info to player {player.id}")
 
-        # Відправляємо повідомлення про початок гри
-        await room.broadcast({
-            "type": "game_started",
-            "phase": "night",
-            "round": 1,
-            "players": [p.to_dict() for p in room.players.values()]
-        })
-        
-        # Відправляємо повідомлення про нічну фазу
+    # Відправляємо оновлений стан всім гравцям
+    await room.broadcast({
+        "type": "player_ready",
+        "version": room.version,
+        "player_id": player.id,
+        "is_ready": player.is_ready
+    })
+
+    # Відправляємо додаткове повідомлення про загальний стан готовності
+    if all_ready:
         await room.broadcast({
-            "type": "phase_change",
-            "phase": "night",
-            "round": 1
-        })
-        
-        print("Game started successfully")
-    except Exception as e:
-        print(f"Error starting game: {str(e)}")
-        await websocket.send_json({
-            "type": "error",
-            "message": f"Помилка при початку гри: {str(e)}"
+            "type": "system",
+            "message": "Всі гравці готові до початку гри!"
         })
 
+# Обробка початку гри
+@register_handler("start_game", EmptyPayload)
+async def handle_start_game(room: GameRoom, player: Player, payload: EmptyPayload):
+    log.info("start game requested", room_id=room.id, player_id=player.id)
+    if player.id != room.owner:
+        log.info("start game rejected", room_id=room.id, reason="not the owner", owner=room.owner)
+        await send_error(player, "Тільки власник кімнати може почати гру")
+        return
+
+    if not room.can_start_game():
+        log.info("start game rejected", room_id=room.id, reason="conditions not met")
+        await send_error(player, "Не всі гравці готові або недостатньо гравців")
+        return
+
+    room.start_game()
+    lobby.sync(room)
+    snapshot_store.save(room)
+    schedule_phase_deadline(room)
+
+    # Відправляємо ролі гравцям; склад мафії збираємо один раз з індексу ролей
+    mafia = mafia_members(room)
+    for p in room.players.values():
+        await p.send(role_message(p, mafia))
+
+    # Після старту всі гравці живі й не готові, тому список не передаємо
+    await room.broadcast({
+        "type": "game_started",
+        "version": room.version,
+        "phase": room.phase.label,
+        "round": room.round
+    })
+
+    # Відправляємо повідомлення про нічну фазу
+    await room.broadcast({
+        "type": "phase_change",
+        "phase": "night",
+        "round": 1
+    })
+
+async def finish_game(room: GameRoom, winner):
+    """Завершує гру: оголошує переможця, знімає кімнату з лобі і записує статистику"""
+    room.phase = Phase.ENDED
+    room.is_game_over = True
+    phase_deadlines.cancel(room.id)
+
+    # Статистику пишемо до оголошення результату: після game_over клієнти виходять з кімнати
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Room).where(Room.id == room.id).values(is_active=False))
+        await db.commit()
+    lobby.remove_room(room.id)
+    snapshot_store.delete(room.id)
+    await record_game_result(room, winner)
+
+    await room.broadcast({
+        "type": "game_over",
+        "winner": winner,
+        "message": f"Гру завершено! Перемогли { 'мирні' if winner == 'citizens' else 'мафія' }."
+    })
+    await room.broadcast({
+        "type": "roles_reveal",
+        "players": [
+            {"name": p.name, "role": p.role_label, "is_alive": p.is_alive}
+            for p in room.players.values()
+        ]
+    })
+
 async def resolve_night(room: GameRoom):
-    mafia_targets = room.night_actions["mafia"]
-    doctor_save = room.night_actions["doctor"]
-    detective_check = room.night_actions["detective"]
+    # Ніч могли вже почати розв'язувати дедлайн або інший гравець
+    if room.resolving:
+        return
+    room.resolving = True
+    try:
+        await _resolve_night(room)
+    finally:
+        room.resolving = False
+
+async def _resolve_night(room: GameRoom):
+    actions = room.night_actions
+    doctor_save = actions.doctor
+    detective_check = actions.detective
 
     # Підраховуємо голоси мафії
-    if mafia_targets:
-        victim_id = max(set(mafia_targets), key=mafia_targets.count)
-        victim = next((p for p in room.players.values() if p.id == victim_id), None)
+    victim_id = actions.mafia_victim()
+    if victim_id is not None:
+        victim = room.get_player(victim_id)
 
         if victim:
             if doctor_save == victim.id:
-                await room.broadcast(json.dumps({
+                await room.broadcast({
                     "type": "player_saved",
                     "message": f"Гравця {victim.name} намагались вбити, але лікар врятував його!"
-                }))
+                })
             else:
-                victim.is_alive = False
-                await room.broadcast(json.dumps({
+                room.kill_player(victim.id)
+                await room.broadcast({
                     "type": "player_killed",
                     "message": f"{victim.name} був вбитий цієї ночі."
-                }))
+                })
 
     if detective_check:
-        checked = next((p for p in room.players.values() if p.id == detective_check), None)
+        checked = room.get_player(detective_check)
         if checked:
-            detective = next((p for p in room.players.values() if p.role == "detective"), None)
+            detective = room.player_with_role(Role.DETECTIVE)
             if detective:
-                await detective.websocket.send_json({
+                await detective.send({
                     "type": "investigation_result",
                     "target": checked.name,
-                    "is_mafia": checked.role == "mafia"
+                    "is_mafia": checked.role == Role.MAFIA
                 })
 
     # Очищаємо нічні дії для наступного раунду
-    room.night_actions = {
-        "mafia": [],
-        "doctor": None,
-        "detective": None
-    }
+    actions.clear()
 
-# Новое - дал ДипСик
     for p in room.players.values():
         p.is_ready = False
     # Перевіряємо умови перемоги
-    winner = check_game_end(room)
+    winner = room.check_victory()
     if winner:
-        await room.broadcast(json.dumps({
-            "type": "game_over",
-            "winner": winner,
-            "message": f"Гру завершено! Перемогли { 'мирні' if winner == 'citizens' else 'мафія' }."
-        }))
-        room.phase = "ended"
+        await finish_game(room, winner)
         return
 
     # Переходимо до денної фази
-    room.phase = "day"
-    await room.broadcast(json.dumps({
+    room.phase = Phase.DAY
+    snapshot_store.save(room)
+    schedule_phase_deadline(room)
+    await room.broadcast({
         "type": "phase_change",
         "phase": "day",
         "round": room.round
-    }))
-
-def check_game_end(room: GameRoom):
-    mafia_alive = [p for p in room.players.values() if p.role == "mafia" and p.is_alive]
-    citizens_alive = [p for p in room.players.values() if p.role != "mafia" and p.is_alive]
-    
-    if not mafia_alive:
-        return "citizens"
-    if len(mafia_alive) >= len(citizens_alive):
-        return "mafia"
-    return None
-
-
+    })
 
-# Обробка нічних дій (наприклад, вбивство)
-@register_handler("night_action")
-async def night_action(websocket, payload, room_id, db, **kwargs):
-    """
-    payload = {
-        "actor_id": int,
-        "target_id": int
-    }
-    """
-    room = await verify_room(websocket, room_id)
-    if not room:
+# Обробка нічних дій (наприклад, вбивство); діє завжди гравець цього з'єднання
+@register_handler("night_action", NightActionPayload)
+async def handle_night_action(room: GameRoom, player: Player, payload: NightActionPayload):
+    if room.phase != Phase.NIGHT:
+        await send_error(player, "Нічні дії можливі лише вночі")
         return
-    
-    if room.is_game_over:
-        await websocket.send_json({
-            "type": "error",
-            "message": "Гра вже завершена"
-        })
-        return
-    
-    actor = next((p for p in room.players.values() if p.id == payload["actor_id"]), None)
-    target = next((p for p in room.players.values() if p.id == payload["target_id"]), None)
 
-    if not actor or not target:
-        await websocket.send_json({
-            "type": "error",
-            "message": "Гравець не знайдений"
-        })
+    target = room.get_player(payload.target_id)
+    if not target:
+        await send_error(player, "Гравець не знайдений")
         return
 
-    if not actor.is_alive:
-        await websocket.send_json({
-            "type": "error",
-            "message": "Мертвий гравець не може діяти"
-        })
+    if not player.is_alive:
+        await send_error(player, "Мертвий гравець не може діяти")
         return
 
-    # Сохраняем действия
-    if actor.role == "mafia":
-        room.night_actions["mafia"].append(target.id)
-    elif actor.role == "doctor":
-        room.night_actions["doctor"] = target.id
-    elif actor.role == "detective":
-        room.night_actions["detective"] = target.id
+    # Зберігаємо дії
+    room.night_actions.record(player, target.id)
 
-    actor.is_ready = True
+    player.is_ready = True
+
+    # Перевіряємо готовність лише спеціальних ролей (мафія, лікар, детектив)
+    special_players = [p for role in NIGHT_ROLES
+                       for p in room.players_with_role(role) if p.is_alive]
 
-    # Проверяем готовность только специальных ролей (мафия, доктор, детектив)
-    special_players = [p for p in room.players.values() 
-                      if p.role in ["mafia", "doctor", "detective"] and p.is_alive]
-    
     if all(p.is_ready for p in special_players):
-        print("Все ночные действия выполнены, разрешаем ночь")
+        log.info("all night actions done, resolving night", room_id=room.id)
         await resolve_night(room)
-        
-        # Проверяем условия победы после разрешения ночи
-        winner = check_game_end(room)
-        if winner:
-            await room.broadcast(json.dumps({
-                "type": "game_over",
-                "winner": winner,
-                "message": f"Гру завершено! Перемогли { 'мирні' if winner == 'citizens' else 'мафія' }."
-            }))
-            room.phase = "ended"
-            room.is_game_over = True
-            
-            db_room = db.query(Room).filter(Room.id == room_id).first()
-            if db_room:
-                db_room.is_active = False
-                db.commit()
-                    
-            await room.broadcast(json.dumps({
-                    "type": "roles_reveal",
-                    "players": [
-                        {"name": p.name, "role": p.role, "is_alive": p.is_alive}
-                        for p in room.players.values()
-                    ]
-                }))
-            return
-    
-@register_handler("vote")
-async def vote(websocket, payload, room_id, db, **kwargs):
-    room = await verify_room(websocket, room_id)
-    if not room:
+
+# Голосування вдень; голосує завжди гравець цього з'єднання
+@register_handler("vote", VotePayload)
+async def handle_vote(room: GameRoom, player: Player, payload: VotePayload):
+    if room.phase != Phase.DAY:
+        await send_error(player, "Голосування відбувається лише вдень")
         return
-    
-    if room.is_game_over:
-        await websocket.send_json({
-            "type": "error",
-            "message": "Гра вже завершена"
-        })
+
+    if not player.is_alive:
+        await send_error(player, "Невірний гравець або мертвий")
         return
-    
-    player = next((p for p in room.players.values() if p.id == int(payload["player_id"])), None)
-    if not player or not player.is_alive:
-        await websocket.send_json({
-            "type": "error",
-            "message": "Невірний гравець або мертвий"
-        })
+
+    target = room.alive.get(payload.target_id)
+    if not target:
+        await send_error(player, "Голосувати можна лише за живого гравця")
         return
-    
-    target_id = int(payload["target_id"])
-    room.votes[target_id] = room.votes.get(target_id, 0) + 1
+
+    # Голос остаточний, інакше дострокове завершення дня могли б перевернути змінені голоси
+    if player.id in room.votes:
+        await send_error(player, "Ви вже проголосували")
+        return
+
+    room.votes.cast(player.id, target.id)
     player.is_ready = True
     
-    await room.broadcast(json.dumps({
+    await room.broadcast({
         "type": "vote_cast",
         "from": player.name,
-        "to": next((p.name for p in room.players.values() if p.id == target_id), "невідомо")
-    }))
-    
-    if all(p.is_ready for p in room.players.values() if p.is_alive):
-        # Підраховуємо голоси
-        vote_count = {}
-        for target_id in room.votes.values():
-            vote_count[target_id] = vote_count.get(target_id, 0) + 1
-        
-        # Знаходимо гравця з найбільшою кількістю голосів
-        max_votes = max(vote_count.values())
-        eliminated_players = [pid for pid, votes in vote_count.items() if votes == max_votes]
-        
-        if len(eliminated_players) == 1:
-            # Ліквідуємо гравця
-            eliminated_id = eliminated_players[0]
-            victim = next((p for p in room.players.values() if p.id == eliminated_id), None)
-        if victim:
-            victim.is_alive = False
-            await room.broadcast(json.dumps({
-                "type": "player_killed_vote",
-                "message": f"{victim.name} був повішений за результатами голосування."
-            }))
+        "to": target.name
+    })
     
-        # Скидаємо голоси та статус готовності
-        room.votes = {}
-        for p in room.players.values():
-            p.is_ready = False
-        
-        # Перевіряємо умови перемоги
-        winner = check_game_end(room)
-        if winner:
-            await room.broadcast(json.dumps({
-                "type": "game_over",
-                "winner": winner,
-                "message": f"Гру завершено! Перемогли { 'мирні' if winner == 'citizens' else 'мафія' }."
-            }))
-            room.phase = "ended"
-            
-            db_room = db.query(Room).filter(Room.id == room_id).first()
-            if db_room:
-                db_room.is_active = False
-                db.commit()
-                
-            await room.broadcast(json.dumps({
-                    "type": "roles_reveal",
-                    "players": [
-                        {"name": p.name, "role": p.role, "is_alive": p.is_alive}
-                        for p in room.players.values()
-                    ]
-                }))
-            return
-        
-        # Збільшуємо раунд та змінюємо фазу
-        room.round += 1
-        room.phase = "night"
-        await room.broadcast(json.dumps({
-            "type": "phase_change",
-            "phase": "night",
-            "round": room.round
-        }))
-
-@register_handler("toggle_ready")
-async def handle_toggle_ready(websocket: WebSocket, payload: dict, room_id: int, db: Session):
-    room = await verify_room(websocket=websocket, room_id=room_id)
-    if not room:
-        return
+    # Завершуємо день, щойно решта голосів уже не може змінити результат
+    if room.votes.is_decided(len(room.alive)):
+        await resolve_day(room)
 
-    # Знаходимо гравця за WebSocket
-    player = next((p for p in room.players.values() if p.websocket == websocket), None)
-    if not player:
-        await websocket.send_json({
-            "type": "error",
-            "message": "Гравець не знайдений"
-        })
+async def resolve_day(room: GameRoom):
+    if room.resolving:
         return
+    room.resolving = True
+    try:
+        await _resolve_day(room)
+    finally:
+        room.resolving = False
+
+async def _resolve_day(room: GameRoom):
+    # При нічиї ніхто не вибуває
+    victim = room.get_player(room.votes.leader())
+    if victim:
+        room.kill_player(victim.id)
+        await room.broadcast({
+            "type": "player_killed_vote",
+            "message": f"{victim.name} був повішений за результатами голосування."
+        })
 
-    # Змінюємо статус готовності
-    player.is_ready = not player.is_ready
-    print(f"Player {player.id} ready state changed to {player.is_ready}")
-
-    # Перевіряємо загальний стан готовності
-    all_ready = all(p.is_ready for p in room.players.values())
-    print(f"All players ready: {all_ready}")
-
-    # Відправляємо оновлення всім гравцям
+    # Скидаємо голоси та статус готовності
+    room.votes.clear()
+    for p in room.players.values():
+        p.is_ready = False
+    
+    # Перевіряємо умови перемоги
+    winner = room.check_victory()
+    if winner:
+        await finish_game(room, winner)
+        return
+    
+    # Збільшуємо раунд та змінюємо фазу
+    room.round += 1
+    room.phase = Phase.NIGHT
+    snapshot_store.save(room)
+    schedule_phase_deadline(room)
     await room.broadcast({
-        "type": "player_ready",
-        "player_id": player.id,
-        "is_ready": player.is_ready,
-        "players": [{
-            "id": p.id,
-            "name": p.name,
-            "username": p.username,
-            "is_ready": p.is_ready,
-            "is_alive": p.is_alive,
-            "role": p.role,
-            "is_owner": p.id == room.owner
-        } for p in room.players.values()]
+        "type": "phase_change",
+        "phase": "night",
+        "round": room.round
     })
-    print(f"Broadcasted ready state update for player {player.id}")
 
-    # Відправляємо додаткове повідомлення про загальний стан готовності
-    if all_ready:
-        await room.broadcast({
-            "type": "system",
-            "message": "Всі гравці готові до початку гри!"
-        })
+# Тривалість фаз; фаза без дедлайну триває, доки всі не походять
+PHASE_SECONDS = {Phase.NIGHT: NIGHT_PHASE_SECONDS, Phase.DAY: DAY_PHASE_SECONDS}
 
-async def handle_message(websocket: WebSocket, message: dict):
-    try:
-        message_type = message.get('type')
-        payload = message.get('payload', {})
-        
-        if message_type == 'chat':
-            username = payload.get('username', 'Гість')
-            message_text = payload.get('message', '')
-            player_id = payload.get('player_id')
-            
-            # Знаходимо гравця за ID або ім'ям
-            player = None
-            if player_id:
-                player = next((p for p in self.players if p.id == player_id), None)
-            if not player:
-                player = next((p for p in self.players if p.username == username), None)
-            
-            if not player:
-                await websocket.send_json({
-                    'type': 'error',
-                    'payload': {
-                        'message': 'Гравець не знайдений'
-                    }
-                })
-                return
-            
-            # Відправляємо повідомлення всім гравцям
-            await self.broadcast({
-                'type': 'chat',
-                'payload': {
-                    'username': player.username,
-                    'message': message_text,
-                    'timestamp': datetime.now().isoformat()
-                }
-            })
-            
-        elif message_type == 'ready':
-            player = next((p for p in self.players if p.websocket == websocket), None)
-            if player:
-                player.is_ready = not player.is_ready
-                await self.broadcast({
-                    'type': 'player_ready',
-                    'payload': {
-                        'username': player.username,
-                        'is_ready': player.is_ready
-                    }
-                })
-                
-        elif message_type == 'start_game':
-            if len(self.players) >= self.min_players:
-                await self.start_game()
-            else:
-                await websocket.send_json({
-                    'type': 'error',
-                    'payload': {
-                        'message': 'Недостатньо гравців для початку гри'
-                    }
-                })
-    except Exception as e:
-        print(f"Помилка обробки повідомлення: {str(e)}")
-        await websocket.send_json({
-            'type': 'error',
-            'payload': {
-                'message': f'Помилка обробки повідомлення: {str(e)}'
-            }
-        })
+def schedule_phase_deadline(room: GameRoom):
+    seconds = PHASE_SECONDS.get(room.phase)
+    if seconds:
+        phase_deadlines.schedule(room.id, seconds, (room.phase, room.round))
+
+async def on_phase_deadline(room_id, key):
+    """Завершує фазу, яку не встигли закінчити гравці, з тими діями, що вже є"""
+    room = active_rooms.get(room_id)
+    if room is None or (room.phase, room.round) != key:
+        return
+    log.info("phase deadline passed", room_id=room_id, phase=room.phase.label, round=room.round)
+    if room.phase == Phase.NIGHT:
+        await resolve_night(room)
+    elif room.phase == Phase.DAY:
+        await resolve_day(room)
+
+phase_deadlines.callback = on_phase_deadline
 
 @router.get("/rooms/{room_id}/players")
-async def get_room_players(room_id: int, db: Session = Depends(get_db)):
+async def get_room_players(room_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Отримати список гравців у кімнаті
     """
     try:
-        print(f"Getting players for room {room_id}")
+        log.debug("room players requested", room_id=room_id)
         
         # Перевіряємо чи існує кімната в базі даних
-        db_room = db.query(Room).filter(Room.id == room_id).first()
+        db_room = await db.get(Room, room_id)
         if not db_room:
-            print(f"Room {room_id} not found in database")
+            log.info("room not found", room_id=room_id)
             raise HTTPException(status_code=404, detail="Кімнату не знайдено")
 
         # Перевіряємо чи існує кімната в активних кімнатах
         room = active_rooms.get(room_id)
         if not room:
-            print(f"Room {room_id} not found in active rooms")
+            log.debug("room is not active", room_id=room_id)
             # Повертаємо порожній список, якщо кімнати немає в активних
             return []
 
@@ -817,232 +654,75 @@ async def get_room_players(room_id: int, db: Session = Depends(get_db)):
         players_list = []
         for player in room.players.values():
             try:
-                player_dict = player.to_dict()
+                player_dict = room.player_dict(player)
                 players_list.append(player_dict)
             except Exception as e:
-                print(f"Error converting player to dict: {str(e)}")
+                log.warning("cannot convert player", room_id=room_id, player_id=player.id, error=str(e))
                 continue
 
-        print(f"Returning players list for room {room_id}: {players_list}")
         return players_list
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in get_room_players: {str(e)}")
+        log.error("error getting room players", room_id=room_id, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Внутрішня помилка сервера: {str(e)}")
 
 def get_room(room_id: int):
     return active_rooms.get(room_id)
 
 @router.get("/rooms/{room_id}/messages")
-async def get_room_messages(room_id: int, db: Session = Depends(get_db)):
+async def get_room_messages(
+        room_id: int,
+        before: Optional[int] = Query(None),
+        after: Optional[int] = Query(None),
+        limit: int = Query(MESSAGES_PAGE_SIZE, ge=1, le=MESSAGES_PAGE_MAX),
+        db: AsyncSession = Depends(get_async_db)
+):
     """
-    Отримати історію повідомлень кімнати
+    Отримати історію повідомлень кімнати.
+    before/after - id повідомлення, від якого гортати назад або вперед;
+    разом вони задають проміжок, який гортається вперед від after;
+    без них повертаються останні повідомлення.
     """
     try:
-        print(f"Getting messages for room {room_id}")
+        log.debug("room messages requested", room_id=room_id, before=before, after=after, limit=limit)
         
         # Перевіряємо чи існує кімната
-        room = db.query(Room).filter(Room.id == room_id).first()
+        room = await db.get(Room, room_id)
         if not room:
-            print(f"Room {room_id} not found")
+            log.info("room not found", room_id=room_id)
             raise HTTPException(status_code=404, detail="Кімнату не знайдено")
             
-        # Отримуємо повідомлення з бази даних
-        messages = db.query(Messages).filter(Messages.room_id == room_id).order_by(Messages.writing_time.desc()).limit(50).all()
-        print(f"Found {len(messages)} messages")
+        # Одним запитом з ім'ям автора; сторінка йде по індексу (room_id, id)
+        query = (
+            select(Messages.id, Messages.message, Messages.writing_time, User.username)
+            .outerjoin(User, User.id == Messages.user_id)
+            .where(Messages.room_id == room_id)
+        )
+        if before is not None:
+            query = query.where(Messages.id < before)
+        if after is not None:
+            query = query.where(Messages.id > after).order_by(Messages.id.asc())
+        else:
+            query = query.order_by(Messages.id.desc())
+        result = await db.execute(query.limit(limit))
+        rows = result.all()
+        if after is None:
+            rows.reverse()  # Перевертаємо список, щоб старі повідомлення були зверху
         
-        # Формуємо список повідомлень
-        messages_list = []
-        for msg in reversed(messages):  # Перевертаємо список, щоб старі повідомлення були зверху
-            try:
-                user = db.query(User).filter(User.id == msg.user_id).first()
-                messages_list.append({
-                    "id": msg.id,
-                    "message": msg.message,
-                    "username": user.username if user else "Гість",
-                    "created_at": msg.writing_time.isoformat() if msg.writing_time else None
-                })
-            except Exception as e:
-                print(f"Error processing message {msg.id}: {str(e)}")
-                continue
-            
-        print(f"Returning {len(messages_list)} messages")
-        return messages_list
+        return [
+            {
+                "id": row.id,
+                "message": row.message,
+                "username": row.username or "Гість",
+                "created_at": row.writing_time.isoformat() if row.writing_time else None
+            }
+            for row in rows
+        ]
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in get_room_messages: {str(e)}")
+        log.error("error getting room messages", room_id=room_id, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Внутрішня помилка сервера: {str(e)}")
-
-async def start_game(self):
-    print("Starting game...")
-    if not self.can_start_game():
-        print("Cannot start game: conditions not met")
-        raise ValueError("Cannot start game: conditions not met")
-    
-    print("Setting game state...")
-    self.phase = "day"
-    self.round = 1
-    self.is_game_over = False
-    self.night_actions = {
-        "mafia": [],
-        "doctor": None,
-        "detective": None
-    }
-    self.votes = {}
-    
-    print("Assigning roles...")
-    self.assign_roles()
-    
-    print("Resetting player states...")
-    for player in self.players.values():
-        player.is_ready = False
-        player.is_alive = True
-        print(f"Player {player.id} ({player.name}): role={player.role}, is_alive={player.is_alive}")
-    
-    # Відправляємо ролі гравцям
-    for player in self.players.values():
-        try:
-            # Базова інформація про роль
-            role_info = {
-                "type": "role_assigned",
-                "role": player.role
-            }
-            
-            # Якщо гравець мафія, додаємо інформацію про інших мафій
-            if player.role == "mafia":
-                other_mafia = [
-                    {"id": p.id, "name": p.name}
-                    for p in self.players.values()
-                    if p.role == "mafia" and p.id != player.id
-                ]
-                role_info["other_mafia"] = other_mafia
-            
-            await player.websocket.send_json(role_info)
-            print(f"Sent role {player.role} to player {player.id}")
-        except Exception as e:
-            print(f"Error sending role to player {player.id}: {str(e)}")
-    
-    # Відправляємо повідомлення про початок гри
-    await self.broadcast({
-        "type": "game_started",
-        "phase": "day",
-        "round": 1,
-        "players": [p.to_dict() for p in self.players.values()]
-    })
-    
-    print(f"Game started in room {self.room_id}")
-
-async def change_phase(self, new_phase):
-    """Зміна фази гри"""
-    self.phase = new_phase
-    await self.broadcast({
-        "type": "phase_change",
-        "phase": new_phase,
-        "round": self.round
-    })
-    
-    # Якщо переходимо в нічну фазу
-    if new_phase == "night":
-        # Скидаємо голоси
-        self.votes = {}
-        # Скидаємо статус готовності для нічних дій
-        for player in self.players.values():
-            if player.role in ["mafia", "doctor", "detective"] and player.is_alive:
-                player.is_ready = False
-    
-    # Якщо переходимо в денну фазу
-    elif new_phase == "day":
-        # Скидаємо нічні дії
-        self.night_actions = {
-            "mafia": [],
-            "doctor": None,
-            "detective": None
-        }
-        # Скидаємо статус готовності для голосування
-        for player in self.players.values():
-            if player.is_alive:
-                player.is_ready = False
-
-async def check_phase_completion(self):
-    """Перевірка завершення фази та зміна фази"""
-    if self.phase == "day":
-        # Перевіряємо чи всі живі гравці проголосували
-        alive_players = [p for p in self.players.values() if p.is_alive]
-        if len(self.votes) == len(alive_players):
-            # Підраховуємо голоси
-            vote_count = {}
-            for target_id in self.votes.values():
-                vote_count[target_id] = vote_count.get(target_id, 0) + 1
-            
-            # Знаходимо гравця з найбільшою кількістю голосів
-            max_votes = max(vote_count.values())
-            eliminated_players = [pid for pid, votes in vote_count.items() if votes == max_votes]
-            
-            if len(eliminated_players) == 1:
-                # Ліквідуємо гравця
-                eliminated_id = eliminated_players[0]
-                self.players[eliminated_id].is_alive = False
-                
-                # Перевіряємо умови перемоги
-                if self.check_win_condition():
-                    return
-                
-                # Переходимо до ночі
-                self.round += 1
-                await self.change_phase("night")
-            else:
-                # Якщо нічия, переходимо до ночі без ліквідації
-                self.round += 1
-                await self.change_phase("night")
-    
-    elif self.phase == "night":
-        # Перевіряємо чи всі спеціальні ролі виконали свої дії
-        special_roles = [p for p in self.players.values() 
-                        if p.role in ["mafia", "doctor", "detective"] and p.is_alive]
-        
-        if all(p.is_ready for p in special_roles):
-            # Виконуємо нічні дії
-            if self.night_actions["mafia"]:
-                target_id = self.night_actions["mafia"][0]
-                if target_id != self.night_actions["doctor"]:
-                    self.players[target_id].is_alive = False
-            
-            # Перевіряємо умови перемоги
-            if self.check_win_condition():
-                return
-            
-            # Переходимо до дня
-            await self.change_phase("day")
-
-async def handle_message(self, websocket, message):
-    """Обробка повідомлень від клієнта"""
-    try:
-        data = json.loads(message)
-        message_type = data.get("type")
-        
-        if message_type == "start_game":
-            await self.start_game()
-        elif message_type == "toggle_ready":
-            await self.toggle_ready(websocket, data["payload"]["is_ready"])
-        elif message_type == "vote":
-            await self.handle_vote(websocket, data["payload"])
-        elif message_type == "night_action":
-            await self.handle_night_action(websocket, data["payload"])
-            # Перевіряємо завершення фази після кожної нічної дії
-            await self.check_phase_completion()
-        elif message_type == "chat":
-            await self.broadcast({
-                "type": "chat",
-                "username": self.players[websocket].name,
-                "message": data["payload"]["message"]
-            })
-    except Exception as e:
-        print(f"Error handling message: {str(e)}")
-        await websocket.send_json({
-            "type": "error",
-            "message": str(e)
-        })
@@ -0,0 +1,74 @@
+import asyncio
+from app.config import HEARTBEAT_INTERVAL, ROOM_IDLE_GRACE
+from app.game_rooms.protocol import MessageFrames
+from app.game_rooms.room_storage import active_rooms
+from app.log import get_logger
+from app.metrics import rooms_reaped
+
+log = get_logger("heartbeat")
+
+# Кадри ping кодуються один раз на кодування і далі лише перевикористовуються
+PING = MessageFrames({"type": "ping"})
+
+
+# Одна фонова задача на воркер: раз на інтервал шле ping усім підключеним гравцям
+# і знімає з пам'яті кімнати, в яких довше за ROOM_IDLE_GRACE немає жодного з'єднання.
+# Мертві з'єднання відключає сам цикл прийому, коли від клієнта довго немає кадрів.
+class HeartbeatMonitor:
+    def __init__(self, interval=HEARTBEAT_INTERVAL, idle_grace=ROOM_IDLE_GRACE, reaper=None):
+        self.interval = interval
+        self.idle_grace = idle_grace
+        self.reaper = reaper  # async reaper(room), прибирає кімнату з пам'яті
+        self.idle_since = {}  # id кімнати -> час, відколи в ній немає підключених гравців
+        self.task = None
+
+    def start(self):
+        if self.task is not None:
+            return
+        self.task = asyncio.create_task(self._run())
+        log.info("heartbeat started", interval=self.interval, idle_grace=self.idle_grace)
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        log.info("heartbeat stopped")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.tick(loop.time())
+            except Exception:
+                log.error("heartbeat tick failed", exc_info=True)
+
+    async def tick(self, now):
+        idle = []
+        for room_id, room in list(active_rooms.items()):
+            connected = [p for p in room.players.values() if p.is_connected and p.websocket is not None]
+            if connected:
+                self.idle_since.pop(room_id, None)
+                for player in connected:
+                    await player.send_frame(PING.encode(player.codec))
+            elif now - self.idle_since.setdefault(room_id, now) >= self.idle_grace:
+                idle.append(room)
+        # Кімнати, зняті з реєстру іншим шляхом, більше не відстежуємо
+        for room_id in [room_id for room_id in self.idle_since if room_id not in active_rooms]:
+            del self.idle_since[room_id]
+        for room in idle:
+            self.idle_since.pop(room.id, None)
+            # Гравець міг підключитись, поки ми прибирали попередні кімнати
+            if active_rooms.get(room.id) is not room or any(p.is_connected for p in room.players.values()):
+                continue
+            log.info("reaping idle room", room_id=room.id, players=len(room.players), phase=room.phase.label)
+            rooms_reaped.inc()
+            await self.reaper(room)
+
+
+heartbeat = HeartbeatMonitor()
@@ -0,0 +1,132 @@
+import hashlib
+from app.game_rooms.protocol import encode_message
+from app.game_rooms.game_models import Phase
+
+
+# Запис кімнати в лобі: поля RoomResponse плюс живий стан з GameRoom
+class LobbyEntry:
+    __slots__ = ("id", "name", "owner", "min_players_number", "max_players_number",
+                 "is_private", "players_number", "in_progress")
+
+    def __init__(self, db_room):
+        self.id = db_room.id
+        self.name = db_room.name
+        self.owner = db_room.owner
+        self.min_players_number = db_room.min_players_number
+        self.max_players_number = db_room.max_players_number
+        self.is_private = bool(db_room.is_private)
+        self.players_number = 0
+        self.in_progress = False
+
+    @classmethod
+    def from_state(cls, state):
+        entry = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(entry, name, state[name])
+        return entry
+
+    def state(self):
+        """Усі поля запису; так запис передається іншим воркерам"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @property
+    def is_full(self):
+        return self.players_number >= self.max_players_number
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "owner": self.owner,
+            "min_players_number": self.min_players_number,
+            "max_players_number": self.max_players_number,
+            "is_private": self.is_private,
+            "players_number": self.players_number,
+            "is_active": True,
+            "in_progress": self.in_progress
+        }
+
+
+# Індекс активних кімнат у пам'яті, з якого віддається GET /api/rooms.
+# Кожна зміна збільшує version і скидає закешовані сторінки. ETag - хеш тіла сторінки,
+# тож він однаковий на всіх воркерах і після рестарту, поки однаковий вміст.
+# Кожен воркер тримає свій індекс; локальні зміни записів розподілений реєстр
+# через publish розсилає іншим воркерам, а ті застосовують їх через apply.
+class LobbyIndex:
+    def __init__(self):
+        self.entries = {}  # room_id -> LobbyEntry, у порядку створення
+        self.version = 0
+        self.pages = {}  # параметри запиту -> (закодована сторінка, ETag) для поточної версії
+        self.publish = None  # publish(room_id, state або None), встановлює розподілений реєстр
+
+    def load(self, db_rooms):
+        """Заповнює індекс активними кімнатами з бази під час старту"""
+        for db_room in db_rooms:
+            self.entries[db_room.id] = LobbyEntry(db_room)
+        self._changed()
+
+    def add_room(self, db_room):
+        self.entries[db_room.id] = LobbyEntry(db_room)
+        self._changed(db_room.id)
+
+    def remove_room(self, room_id):
+        if self.entries.pop(room_id, None) is not None:
+            self._changed(room_id)
+
+    def apply(self, room_id, state):
+        """Зміна запису, що прийшла з іншого воркера; далі не розсилається"""
+        if state is None:
+            if self.entries.pop(room_id, None) is None:
+                return
+        else:
+            self.entries[room_id] = LobbyEntry.from_state(state)
+        self._changed()
+
+    def sync(self, room):
+        """Переносить у лобі кількість гравців, власника і фазу з GameRoom"""
+        entry = self.entries.get(room.id)
+        if entry is None:
+            return
+        players_number = len(room.players)
+        in_progress = room.phase != Phase.WAITING
+        if (entry.players_number, entry.in_progress, entry.owner) != (players_number, in_progress, room.owner):
+            entry.players_number = players_number
+            entry.in_progress = in_progress
+            entry.owner = room.owner
+            self._changed(room.id)
+
+    def reset(self, room_id):
+        """Кімната знята з пам'яті: у лобі вона знову порожня і чекає на гравців"""
+        entry = self.entries.get(room_id)
+        if entry is not None and (entry.players_number or entry.in_progress):
+            entry.players_number = 0
+            entry.in_progress = False
+            self._changed(room_id)
+
+    def page(self, private=None, full=None, in_progress=None, offset=0, limit=50):
+        """Повертає (закодований JSON сторінки, ETag); однакові запити в межах версії не перераховуються"""
+        key = (private, full, in_progress, offset, limit)
+        page = self.pages.get(key)
+        if page is None:
+            rooms = [
+                entry.to_dict() for entry in self.entries.values()
+                if (private is None or entry.is_private == private)
+                and (full is None or entry.is_full == full)
+                and (in_progress is None or entry.in_progress == in_progress)
+            ]
+            body = encode_message(rooms[offset:offset + limit])
+            etag = '"' + hashlib.blake2b(body.encode("utf-8"), digest_size=16).hexdigest() + '"'
+            if len(self.pages) >= 256:
+                self.pages.clear()
+            page = self.pages[key] = (body, etag)
+        return page
+
+    def _changed(self, room_id=None):
+        self.version += 1
+        self.pages.clear()
+        if room_id is not None and self.publish is not None:
+            entry = self.entries.get(room_id)
+            self.publish(room_id, entry.state() if entry is not None else None)
+
+
+lobby = LobbyIndex()
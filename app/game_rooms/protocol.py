@@ -0,0 +1,106 @@
+import json
+import zlib
+from app.config import WS_ENCODINGS, WS_COMPRESSION, WS_COMPRESSION_LEVEL, WS_MAX_INFLATED_SIZE
+
+try:
+    import orjson
+except ImportError:  # orjson необов'язковий, без нього працює стандартний json
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # без msgpack клієнти отримують лише JSON
+    msgpack = None
+
+
+# Кодуємо повідомлення в JSON-рядок один раз, щоб розіслати його всім гравцям
+def encode_message(message) -> str:
+    if isinstance(message, str):
+        # Рядок вважаємо вже закодованим кадром
+        return message
+    if orjson is not None:
+        return orjson.dumps(message).decode("utf-8")
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+class CodecError(ValueError):
+    pass
+
+
+# Кодування кадрів одного з'єднання: JSON-текст або двійковий msgpack, за бажанням стиснені deflate.
+# Стиснений кадр завжди двійковий. Одним кодеком кодується розсилка і розбирається вхідний кадр
+class Codec:
+    def __init__(self, encoding="json", compress=False):
+        self.encoding = encoding
+        self.compress = compress
+
+    def __repr__(self):
+        return f"Codec({self.encoding!r}, compress={self.compress})"
+
+    def encode(self, message):
+        if self.encoding == "msgpack":
+            frame = msgpack.packb(message)
+        else:
+            frame = encode_message(message)
+        if self.compress:
+            if isinstance(frame, str):
+                frame = frame.encode("utf-8")
+            # Сирий deflate без заголовка zlib, як у permessage-deflate
+            compressor = zlib.compressobj(WS_COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+            frame = compressor.compress(frame) + compressor.flush()
+        return frame
+
+    def decode(self, raw):
+        # Текстовий кадр завжди JSON, навіть якщо з'єднання домовилось про інше кодування
+        if isinstance(raw, str):
+            return json.loads(raw)
+        if self.compress:
+            inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+            try:
+                raw = inflater.decompress(raw, WS_MAX_INFLATED_SIZE)
+            except zlib.error as e:
+                raise CodecError(str(e))
+            if inflater.unconsumed_tail:
+                raise CodecError("inflated frame is too large")
+        if self.encoding == "msgpack":
+            return msgpack.unpackb(raw)
+        return json.loads(raw)
+
+
+JSON_CODEC = Codec()
+
+_codecs = {("json", False): JSON_CODEC}
+
+
+def negotiate_codec(encoding=None, compress=None):
+    """Кодек за параметрами рукостискання або None, якщо їх не підтримуємо"""
+    encoding = encoding or "json"
+    if encoding not in WS_ENCODINGS or (encoding == "msgpack" and msgpack is None):
+        return None
+    if compress in (None, "", "none"):
+        deflate = False
+    elif compress == "deflate" and WS_COMPRESSION:
+        deflate = True
+    else:
+        return None
+    # Кодеків небагато і вони спільні, тож кадр розсилки кодується один раз на кодек
+    codec = _codecs.get((encoding, deflate))
+    if codec is None:
+        codec = _codecs[(encoding, deflate)] = Codec(encoding, deflate)
+    return codec
+
+
+# Кадри одного повідомлення в усіх кодуваннях, що знадобились отримувачам;
+# кожне кодування виконується не більше одного разу
+class MessageFrames:
+    __slots__ = ("message", "frames")
+
+    def __init__(self, message):
+        self.message = message
+        self.frames = {}
+
+    def encode(self, codec):
+        frame = self.frames.get(codec)
+        if frame is None:
+            frame = self.frames[codec] = codec.encode(self.message)
+        return frame
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from app.log import get_logger
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis потрібен лише для розподіленого реєстру
+    aioredis = None
+
+log = get_logger("pubsub")
+
+
+# Продовжує оренду, лише якщо ключ досі належить цьому власнику
+_RENEW_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("EXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+# Брокер у межах одного процесу: для тестів і локального запуску кількох реєстрів,
+# що імітують окремі воркери. Реєстри, що мають бачити один одного, ділять один брокер
+class InProcessBroker:
+    def __init__(self):
+        self.subscribers = []  # колбеки async (channel, sender, frame)
+        self.owners = {}  # ключ -> (власник, момент закінчення оренди за time.monotonic)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    async def publish(self, channel, sender, frame):
+        for callback in list(self.subscribers):
+            await callback(channel, sender, frame)
+
+    def _owner(self, key):
+        lease = self.owners.get(key)
+        if lease is None:
+            return None
+        if lease[1] <= time.monotonic():
+            del self.owners[key]
+            return None
+        return lease[0]
+
+    async def claim(self, key, owner, ttl):
+        """Закріплює ключ за власником на ttl секунд, якщо він вільний; повертає фактичного власника"""
+        current = self._owner(key)
+        if current is None:
+            self.owners[key] = (owner, time.monotonic() + ttl)
+            return owner
+        return current
+
+    async def renew(self, key, owner, ttl):
+        """Продовжує оренду ключа; False, якщо ключ уже не належить власнику"""
+        if self._owner(key) != owner:
+            return False
+        self.owners[key] = (owner, time.monotonic() + ttl)
+        return True
+
+    async def release(self, key, owner):
+        if self._owner(key) == owner:
+            del self.owners[key]
+
+
+# Спільний брокер для create_registry("inprocess")
+inprocess_broker = InProcessBroker()
+
+
+# Брокер на Redis: одна підписка за шаблоном на зміни лобі і SET NX для власності кімнат
+class RedisBroker:
+    def __init__(self, url, prefix="mafia:"):
+        if aioredis is None:
+            raise RuntimeError("ROOM_REGISTRY_BACKEND='redis' потребує пакет redis")
+        self.redis = aioredis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.subscribers = []
+        self.pubsub = None
+        self.listener = None
+
+    async def start(self):
+        self.pubsub = self.redis.pubsub()
+        await self.pubsub.psubscribe(f"{self.prefix}lobby:*")
+        self.listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self.listener is not None:
+            self.listener.cancel()
+            self.listener = None
+        if self.pubsub is not None:
+            await self.pubsub.close()
+            self.pubsub = None
+        await self.redis.close()
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    async def publish(self, channel, sender, frame):
+        await self.redis.publish(self.prefix + channel, f"{sender}\n{frame}")
+
+    async def claim(self, key, owner, ttl):
+        await self.redis.set(self.prefix + key, owner, nx=True, ex=ttl)
+        return await self.redis.get(self.prefix + key)
+
+    async def renew(self, key, owner, ttl):
+        return bool(await self.redis.eval(_RENEW_SCRIPT, 1, self.prefix + key, owner, ttl))
+
+    async def release(self, key, owner):
+        await self.redis.eval(_RELEASE_SCRIPT, 1, self.prefix + key, owner)
+
+    async def _listen(self):
+        async for message in self.pubsub.listen():
+            if message["type"] != "pmessage":
+                continue
+            channel = message["channel"][len(self.prefix):]
+            sender, _, frame = message["data"].partition("\n")
+            for callback in list(self.subscribers):
+                try:
+                    await callback(channel, sender, frame)
+                except Exception as e:
+                    log.error("error handling message", channel=channel, error=str(e))
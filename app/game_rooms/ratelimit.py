@@ -0,0 +1,81 @@
+import time
+from app.config import PLAYER_RATE_LIMITS, ROOM_RATE_LIMITS, WORKER_RATE_LIMITS, RATE_LIMIT_MAX_STRIKES
+
+
+# Відро токенів: rate токенів за секунду, не більше capacity про запас.
+# Поповнюється ліниво під час take, тож простій нічого не коштує
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if tokens < 1:
+            self.tokens = tokens
+            return False
+        self.tokens = tokens - 1
+        return True
+
+
+def _take(buckets, limits, key, now):
+    """Тип без ліміту в таблиці не обмежується"""
+    bucket = buckets.get(key)
+    if bucket is None:
+        limit = limits.get(key)
+        if limit is None:
+            return True
+        bucket = buckets[key] = TokenBucket(*limit)
+    return bucket.take(now)
+
+
+# Відра воркера спільні для всіх кімнат і з'єднань
+_worker_buckets = {}
+
+
+# Ліміти вхідних кадрів одного з'єднання. Ключ "*" в PLAYER_RATE_LIMITS обмежує
+# усі кадри з'єднання, решта ключів - кадри свого типу на рівні гравця, кімнати і воркера.
+# Страйки рахуються лише за власні ліміти гравця: спільний бюджет кімнати чи воркера
+# могли вичерпати інші, і гравця за це не відключаємо
+class FrameLimiter:
+    def __init__(self, player_limits=PLAYER_RATE_LIMITS, room_limits=ROOM_RATE_LIMITS,
+                 worker_limits=WORKER_RATE_LIMITS, max_strikes=RATE_LIMIT_MAX_STRIKES):
+        self.player_limits = player_limits
+        self.room_limits = room_limits
+        self.worker_limits = worker_limits
+        self.max_strikes = max_strikes
+        self.buckets = {}
+        self.strikes = 0  # відкинутих за ліміти гравця кадрів поспіль
+
+    def check_frame(self):
+        """Перевірка будь-якого кадру ще до розбору; повертає рівень, що відмовив, або None"""
+        if _take(self.buckets, self.player_limits, "*", time.monotonic()):
+            return None
+        return "player"
+
+    def check_message(self, message_type, room_buckets):
+        """Перевірка кадру відомого типу; room_buckets - відра кімнати"""
+        now = time.monotonic()
+        if not _take(self.buckets, self.player_limits, message_type, now):
+            return "player"
+        if not _take(room_buckets, self.room_limits, message_type, now):
+            return "room"
+        if not _take(_worker_buckets, self.worker_limits, message_type, now):
+            return "worker"
+        return None
+
+    def reject(self, scope):
+        """Рахує відкинутий кадр; повертає (чи попередити клієнта, чи закрити з'єднання)"""
+        if scope != "player":
+            return True, False
+        self.strikes += 1
+        # Одне попередження на серію відкинутих кадрів, а не відповідь на кожен
+        return self.strikes == 1, self.strikes >= self.max_strikes
+
+    def accept(self):
+        self.strikes = 0
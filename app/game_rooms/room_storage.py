@@ -1,4 +1,147 @@
+import asyncio
+import json
+import os
+from collections.abc import MutableMapping
 from typing import Dict
 from app.game_rooms.game_models import GameRoom
+from app.game_rooms.lobby import lobby as worker_lobby
+from app.game_rooms.protocol import encode_message
+from app.game_rooms.pubsub import RedisBroker, inprocess_broker
+from app.config import ROOM_REGISTRY_BACKEND, REDIS_URL, WORKER_ID, ROOM_OWNERSHIP_TTL
+from app.log import get_logger
 
-active_rooms : Dict[int, GameRoom] = {}
\ No newline at end of file
+log = get_logger("room_storage")
+
+
+# Реєстр кімнат воркера. Поводиться як dict room_id -> GameRoom;
+# базова реалізація - звичайний словник для одного воркера
+class RoomRegistry(MutableMapping):
+    def __init__(self, worker_id=WORKER_ID):
+        self.worker_id = worker_id
+        self.rooms: Dict[int, GameRoom] = {}
+
+    def __getitem__(self, room_id):
+        return self.rooms[room_id]
+
+    def __setitem__(self, room_id, room):
+        self.rooms[room_id] = room
+
+    def __delitem__(self, room_id):
+        del self.rooms[room_id]
+
+    def __iter__(self):
+        return iter(self.rooms)
+
+    def __len__(self):
+        return len(self.rooms)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def claim(self, room_id):
+        """Повертає id воркера, що обслуговує кімнату"""
+        return self.worker_id
+
+    async def release(self, room_id):
+        pass
+
+
+# Реєстр для кількох воркерів. Кімната живе в пам'яті лише свого власника: перше
+# підключення закріплює її в брокері за цим воркером, решта клієнтів отримує 4010
+# з id власника (його MAFIA_WORKER_URL) і перепідключається туди. Власність - оренда
+# на ownership_ttl секунд, яку власник продовжує, поки тримає кімнату в пам'яті,
+# тож кімнати впалого воркера звільняються самі. Між воркерами через pub/sub
+# ходять лише зміни лобі, щоб GET /api/rooms показував кімнати всіх воркерів.
+#
+# Маршрутизація навмисно лише "липка", без ретрансляції кадрів broadcast. Стан гри
+# (ролі, нічні дії, голоси, дедлайни фаз) живе в GameRoom одного процесу, і кожен
+# кадр гравця має оброблятися саме там. Ретрансляція розсилки донесла б вихідні
+# кадри до гравців на іншому воркері, але не їхні дії до кімнати і не особисті
+# повідомлення (роль, результат перевірки детектива). Тож кімната розходилась би між
+# копіями. Коли всі гравці кімнати на її власнику, ретрансляції просто нікому доставляти.
+class DistributedRoomRegistry(RoomRegistry):
+    def __init__(self, broker, worker_id=WORKER_ID, ownership_ttl=ROOM_OWNERSHIP_TTL, lobby=None):
+        super().__init__(worker_id)
+        self.broker = broker
+        self.ownership_ttl = ownership_ttl
+        self.lobby = lobby if lobby is not None else worker_lobby
+        self.outbox = asyncio.Queue()  # (room_id, закодований запис лобі) для публікації по черзі
+        self.tasks = []
+
+    async def start(self):
+        if "://" not in self.worker_id:
+            log.warning("MAFIA_WORKER_URL is not set, clients cannot be redirected to this worker",
+                        worker_id=self.worker_id)
+        self.broker.subscribe(self._on_message)
+        await self.broker.start()
+        self.lobby.publish = self.publish_lobby
+        self.tasks = [asyncio.create_task(self._publisher()), asyncio.create_task(self._renewer())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.lobby.publish = None
+        self.broker.unsubscribe(self._on_message)
+        for room_id in list(self.rooms):
+            await self.release(room_id)
+        await self.broker.stop()
+
+    async def claim(self, room_id):
+        return await self.broker.claim(f"owner:{room_id}", self.worker_id, self.ownership_ttl)
+
+    async def release(self, room_id):
+        await self.broker.release(f"owner:{room_id}", self.worker_id)
+
+    async def renew(self):
+        """Продовжує оренду всіх кімнат у пам'яті воркера"""
+        for room_id in list(self.rooms):
+            if await self.broker.renew(f"owner:{room_id}", self.worker_id, self.ownership_ttl):
+                continue
+            # Оренда встигла закінчитись; повертаємо кімнату, якщо її ще ніхто не забрав
+            owner = await self.claim(room_id)
+            if owner != self.worker_id:
+                log.warning("room ownership lost", room_id=room_id, owner=owner)
+
+    def publish_lobby(self, room_id, state):
+        # Лобі змінюється із синхронного коду, тож публікацію виконує окрема задача
+        self.outbox.put_nowait((room_id, encode_message(state)))
+
+    async def _publisher(self):
+        while True:
+            room_id, frame = await self.outbox.get()
+            try:
+                await self.broker.publish(f"lobby:{room_id}", self.worker_id, frame)
+            except Exception as e:
+                log.error("lobby publish failed", room_id=room_id, error=str(e))
+
+    async def _renewer(self):
+        while True:
+            await asyncio.sleep(self.ownership_ttl / 3)
+            try:
+                await self.renew()
+            except Exception as e:
+                log.error("ownership renewal failed", error=str(e))
+
+    async def _on_message(self, channel, sender, frame):
+        # Свої зміни вже в лобі
+        if sender == self.worker_id:
+            return
+        self.lobby.apply(int(channel.split(":", 1)[1]), json.loads(frame))
+
+
+def create_registry(backend=ROOM_REGISTRY_BACKEND):
+    if backend == "redis":
+        if not os.environ.get("MAFIA_SECRET_KEY"):
+            raise RuntimeError("ROOM_REGISTRY_BACKEND='redis' потребує спільного для всіх воркерів MAFIA_SECRET_KEY")
+        return DistributedRoomRegistry(RedisBroker(REDIS_URL))
+    if backend == "inprocess":
+        return DistributedRoomRegistry(inprocess_broker)
+    return RoomRegistry()
+
+
+active_rooms : RoomRegistry = create_registry()
@@ -0,0 +1,78 @@
+import asyncio
+import heapq
+from app.log import get_logger
+
+log = get_logger("scheduler")
+
+
+# Дедлайни фаз усіх кімнат в одній купі з однією фоновою задачею.
+# Перенесений або скасований дедлайн лишається в купі і пропускається, коли дійде черга.
+class PhaseScheduler:
+    def __init__(self, callback=None):
+        self.callback = callback  # async callback(room_id, key)
+        self.heap = []  # (час, id кімнати, ключ фази)
+        self.current = {}  # id кімнати -> (час, ключ фази)
+        self.wakeup = None
+        self.task = None
+
+    def start(self):
+        if self.task is not None:
+            return
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+        log.info("phase scheduler started")
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        log.info("phase scheduler stopped", pending=len(self.current))
+
+    def schedule(self, room_id, delay, key):
+        """Призначає дедлайн фази кімнати, замінюючи попередній"""
+        if self.task is None:
+            self.start()
+        deadline = asyncio.get_running_loop().time() + delay
+        self.current[room_id] = (deadline, key)
+        earliest = self.heap[0][0] if self.heap else None
+        heapq.heappush(self.heap, (deadline, room_id, key))
+        # Купа з переважно застарілих записів перебудовується, щоб не росла без меж
+        if len(self.heap) > 2 * len(self.current) + 1024:
+            self.heap = [(deadline, room_id, key) for room_id, (deadline, key) in self.current.items()]
+            heapq.heapify(self.heap)
+        if earliest is None or deadline < earliest:
+            self.wakeup.set()
+
+    def cancel(self, room_id):
+        self.current.pop(room_id, None)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            while self.heap and self.heap[0][0] <= now:
+                deadline, room_id, key = heapq.heappop(self.heap)
+                if self.current.get(room_id) != (deadline, key):
+                    continue
+                del self.current[room_id]
+                asyncio.create_task(self._fire(room_id, key))
+            timeout = self.heap[0][0] - now if self.heap else None
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, room_id, key):
+        try:
+            await self.callback(room_id, key)
+        except Exception:
+            log.error("phase deadline handler failed", room_id=room_id, exc_info=True)
+
+
+phase_deadlines = PhaseScheduler()
@@ -0,0 +1,119 @@
+import asyncio
+import io
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from app.config import SNAPSHOT_DIR
+from app.game_rooms.game_models import GameRoom, Player, Role, Phase
+from app.log import get_logger
+
+log = get_logger("snapshots")
+
+# Збільшувати при зміні формату; знімки іншого формату ігноруються
+SNAPSHOT_FORMAT = 3
+
+
+# Знімок - кортеж із самих примітивів, тому розпаковувати класи не дозволяємо
+class _PrimitiveUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"Unexpected class in snapshot: {module}.{name}")
+
+
+def dump_room(room: GameRoom) -> bytes:
+    state = (
+        SNAPSHOT_FORMAT,
+        room.id, room.name, room.owner, room.min_players, room.max_players,
+        int(room.phase), room.round, room.is_game_over, room.version,
+        # Роль пишемо числом, 0 - гравець без ролі
+        tuple((p.id, p.name, int(p.role or 0), p.is_alive, p.is_ready) for p in room.players.values()),
+        (tuple(room.night_actions.mafia.items()), room.night_actions.doctor, room.night_actions.detective),
+        tuple(room.votes.ballots.items()),
+    )
+    return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_room(data: bytes):
+    state = _PrimitiveUnpickler(io.BytesIO(data)).load()
+    if state[0] != SNAPSHOT_FORMAT:
+        return None
+    (_, room_id, name, owner, min_players, max_players, phase, round_number,
+     is_game_over, version, players, night_actions, votes) = state
+    room = GameRoom(id=room_id, name=name, owner_id=owner, min_players=min_players, max_players=max_players)
+    room.phase = Phase(phase)
+    room.round = round_number
+    room.is_game_over = is_game_over
+    for player_id, player_name, role, is_alive, is_ready in players:
+        # Гравці чекають на повторне підключення, до того часу їм нічого не відправляється
+        player = Player(id=player_id, name=player_name, websocket=None)
+        player.is_connected = False
+        player.role = Role(role) if role else None
+        player.is_alive = is_alive
+        player.is_ready = is_ready
+        # add_player заносить гравця в індекси кімнати за його роллю і станом
+        room.add_player(player)
+    room.version = version
+    mafia, doctor, detective = night_actions
+    room.night_actions.mafia.update(mafia)
+    room.night_actions.doctor = doctor
+    room.night_actions.detective = detective
+    for voter, target in votes:
+        room.votes.cast(voter, target)
+    return room
+
+
+# Зберігає знімки кімнат на диск в одному фоновому потоці, у порядку надходження
+class SnapshotStore:
+    def __init__(self, directory=SNAPSHOT_DIR):
+        self.directory = directory
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshots")
+
+    def path(self, room_id):
+        return os.path.join(self.directory, f"room-{room_id}.snap")
+
+    def save(self, room: GameRoom):
+        """Знімає стан зараз, а пише на диск поза event loop"""
+        data = dump_room(room)
+        asyncio.get_running_loop().run_in_executor(self.executor, self._write, room.id, data)
+
+    def delete(self, room_id):
+        asyncio.get_running_loop().run_in_executor(self.executor, self._remove, room_id)
+
+    def load_all(self):
+        rooms = []
+        if not os.path.isdir(self.directory):
+            return rooms
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".snap"):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename), "rb") as f:
+                    room = load_room(f.read())
+            except Exception as e:
+                log.warning("cannot restore snapshot", file=filename, error=str(e))
+                continue
+            if room is not None:
+                rooms.append(room)
+        return rooms
+
+    async def close(self):
+        # Дочікуємось запису знімків, що вже в черзі
+        await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+
+    def _write(self, room_id, data):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = self.path(room_id) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(room_id))
+        except Exception as e:
+            log.error("error writing snapshot", room_id=room_id, error=str(e))
+
+    def _remove(self, room_id):
+        try:
+            os.remove(self.path(room_id))
+        except FileNotFoundError:
+            pass
+
+
+snapshot_store = SnapshotStore()
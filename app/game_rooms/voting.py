@@ -0,0 +1,97 @@
+# Денне голосування: хто за кого голосує, скільки голосів у кожної цілі і хто лідирує.
+# Кожен голос чи його зміна оновлює підсумок за O(1), без перерахунку всіх бюлетенів.
+# Дострокове завершення (is_decided) спирається на те, що поданий голос остаточний:
+# обробник голосування не дає його змінити, повторно голосує лише той, чия ціль вибула.
+class VoteTally:
+    __slots__ = ("ballots", "counts", "buckets", "top")
+
+    def __init__(self):
+        self.ballots = {}  # виборець -> ціль
+        self.counts = {}  # ціль -> кількість голосів
+        self.buckets = {}  # кількість голосів -> множина цілей з такою кількістю
+        self.top = 0  # найбільша кількість голосів у однієї цілі
+
+    def __len__(self):
+        return len(self.ballots)
+
+    def __contains__(self, voter):
+        return voter in self.ballots
+
+    def _move(self, target, delta):
+        count = self.counts.get(target, 0)
+        if count:
+            bucket = self.buckets[count]
+            bucket.discard(target)
+            if not bucket:
+                del self.buckets[count]
+        count += delta
+        if count:
+            self.counts[target] = count
+            self.buckets.setdefault(count, set()).add(target)
+        else:
+            del self.counts[target]
+        if count > self.top:
+            self.top = count
+        # Лідер міг втратити голос; нова вершина нижча щонайбільше на один
+        while self.top and self.top not in self.buckets:
+            self.top -= 1
+
+    def cast(self, voter, target):
+        """Голос або зміна голосу"""
+        previous = self.ballots.get(voter)
+        if previous == target:
+            return
+        if previous is not None:
+            self._move(previous, -1)
+        self.ballots[voter] = target
+        self._move(target, 1)
+
+    def retract(self, voter):
+        """Прибирає голос гравця, що вибув або вийшов"""
+        previous = self.ballots.pop(voter, None)
+        if previous is not None:
+            self._move(previous, -1)
+
+    def drop_target(self, target):
+        """Знімає голоси за гравця, що вибув або вийшов; його виборці знову не проголосували.
+        Повертає цих виборців"""
+        count = self.counts.get(target)
+        if not count:
+            return []
+        voters = [voter for voter, choice in self.ballots.items() if choice == target]
+        for voter in voters:
+            del self.ballots[voter]
+        self._move(target, -count)
+        return voters
+
+    def leader(self):
+        """Ціль з найбільшою кількістю голосів або None при нічиї"""
+        bucket = self.buckets.get(self.top)
+        if bucket and len(bucket) == 1:
+            return next(iter(bucket))
+        return None
+
+    def runner_up(self):
+        """Кількість голосів у другої цілі (дорівнює лідеру при нічиї)"""
+        if not self.top:
+            return 0
+        if len(self.buckets[self.top]) > 1:
+            return self.top
+        count = self.top - 1
+        while count and count not in self.buckets:
+            count -= 1
+        return count
+
+    def is_decided(self, voters):
+        """Чи вирішено результат: голоси тих, хто ще не голосував, його вже не змінять.
+        Поданий голос вважається остаточним"""
+        remaining = voters - len(self.ballots)
+        if remaining <= 0:
+            return True
+        return self.top > self.runner_up() + remaining
+
+    def clear(self):
+        self.ballots.clear()
+        self.counts.clear()
+        self.buckets.clear()
+        self.top = 0
@@ -0,0 +1,104 @@
+import bisect
+from sqlalchemy import select
+from app import models
+from app.database import AsyncSessionLocal
+from app.user_cache import user_cache
+from app.game_rooms.game_models import Role
+from app.log import get_logger
+
+log = get_logger("leaderboard")
+
+# Показники, за якими можна впорядкувати рейтинг
+LEADERBOARD_ORDERINGS = ("matches", "survivor_matches", "mafia_matches")
+
+
+# Рейтинг за одним показником: відсортований список ключів (-значення, id).
+# Місце гравця шукається бінарним пошуком, тобто за O(log n).
+class Ranking:
+    def __init__(self):
+        self.keys = []
+        self.scores = {}  # user_id -> значення
+
+    def set(self, user_id, score):
+        old = self.scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            del self.keys[bisect.bisect_left(self.keys, (-old, user_id))]
+        self.scores[user_id] = score
+        bisect.insort(self.keys, (-score, user_id))
+
+    def rank(self, user_id):
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return bisect.bisect_left(self.keys, (-score, user_id)) + 1
+
+    def page(self, offset, limit):
+        return [user_id for _, user_id in self.keys[offset:offset + limit]]
+
+
+# Таблиця лідерів у пам'яті, оновлюється разом із записом результатів гри
+class Leaderboard:
+    def __init__(self):
+        self.users = {}  # user_id -> рядок таблиці
+        self.rankings = {name: Ranking() for name in LEADERBOARD_ORDERINGS}
+
+    def load(self, users):
+        """Перебудовує рейтинг з бази, щоб він був правильним і після рестарту"""
+        self.users.clear()
+        self.rankings = {name: Ranking() for name in LEADERBOARD_ORDERINGS}
+        for user in users:
+            self.update(user)
+
+    def update(self, user):
+        row = {
+            "id": user.id,
+            "username": user.username,
+            "matches": user.matches or 0,
+            "survivor_matches": user.survivor_matches or 0,
+            "mafia_matches": user.mafia_matches or 0
+        }
+        self.users[user.id] = row
+        for name, ranking in self.rankings.items():
+            ranking.set(user.id, row[name])
+
+    def top(self, order_by="matches", offset=0, limit=10):
+        return [self.users[user_id] for user_id in self.rankings[order_by].page(offset, limit)]
+
+    def rank(self, user_id, order_by="matches"):
+        rank = self.rankings[order_by].rank(user_id)
+        if rank is None:
+            return None
+        return {**self.users[user_id], "rank": rank, "total": len(self.users)}
+
+
+leaderboard = Leaderboard()
+
+
+async def load_leaderboard():
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(models.User))
+        leaderboard.load(result.scalars().all())
+
+
+async def record_game_result(room, winner):
+    """Записує статистику учасників завершеної гри і оновлює рейтинг"""
+    players = {p.id: p for p in room.players.values() if p.id}
+    if not players:
+        return
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(models.User).where(models.User.id.in_(players)))
+        users = result.scalars().all()
+        for user in users:
+            player = players[user.id]
+            user.matches = (user.matches or 0) + 1
+            if player.is_alive:
+                user.survivor_matches = (user.survivor_matches or 0) + 1
+            if player.role == Role.MAFIA:
+                user.mafia_matches = (user.mafia_matches or 0) + 1
+        await db.commit()
+    for user in users:
+        leaderboard.update(user)
+        user_cache.invalidate(user_id=user.id)
+    log.info("game results recorded", room_id=room.id, players=len(users), winner=winner)
@@ -0,0 +1,139 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from app.config import LOG_LEVEL, LOG_SAMPLE_RATE
+
+# Атрибут LogRecord, у якому передаються поля контексту
+_RECORD_FIELDS = "fields"
+
+
+# Один рядок JSON на подію: час, рівень, логер, подія і поля контексту
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, _RECORD_FIELDS, None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# Кладе запис у чергу як є; форматування і запис у stdout робить потік слухача
+class _DeferredQueueHandler(QueueHandler):
+    def prepare(self, record):
+        return record
+
+
+_listener = None
+
+
+def setup_logging(level=LOG_LEVEL, stream=None):
+    """Налаштовує логер "mafia": черга в event loop, вивід у фоновому потоці"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    _listener = QueueListener(records, output, respect_handler_level=False)
+    _listener.start()
+
+    root = logging.getLogger("mafia")
+    root.handlers[:] = [_DeferredQueueHandler(records)]
+    root.setLevel(level)
+    root.propagate = False
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_stop_listener)
+
+
+# Обмежує часті події: не більше rate записів на секунду для одного ключа
+class _Sampler:
+    def __init__(self, rate):
+        self.rate = rate
+        self.windows = {}  # ключ -> [початок вікна, записано, пропущено]
+
+    def allow(self, key):
+        """Повертає None, якщо подію пропустити, інакше кількість пропущених до неї"""
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= 1.0:
+            suppressed = window[2] if window else 0
+            self.windows[key] = [now, 1, 0]
+            return suppressed
+        if window[1] < self.rate:
+            window[1] += 1
+            return 0
+        window[2] += 1
+        return None
+
+
+_sampler = _Sampler(LOG_SAMPLE_RATE)
+
+
+# Логер з полями контексту: log.bind(room_id=1).info("player joined", player_id=2)
+class StructLogger:
+    __slots__ = ("logger", "context")
+
+    def __init__(self, logger, context=None):
+        self.logger = logger
+        self.context = context or {}
+
+    def bind(self, **fields):
+        return StructLogger(self.logger, {**self.context, **fields})
+
+    def is_enabled(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def _log(self, level, event, fields, exc_info=None):
+        if self.context:
+            fields = {**self.context, **fields}
+        self.logger.log(level, event, exc_info=exc_info, extra={_RECORD_FIELDS: fields}, stacklevel=3)
+
+    def debug(self, event, **fields):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        if self.logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, event, fields)
+
+    def error(self, event, exc_info=None, **fields):
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, event, fields, exc_info=exc_info)
+
+    def sampled(self, level, event, **fields):
+        """Для подій на кожне повідомлення: записує не частіше за LOG_SAMPLE_RATE на секунду"""
+        if not self.logger.isEnabledFor(level):
+            return
+        suppressed = _sampler.allow((self.logger.name, event))
+        if suppressed is None:
+            return
+        if suppressed:
+            fields["suppressed"] = suppressed
+        self._log(level, event, fields)
+
+
+def get_logger(name, **context):
+    return StructLogger(logging.getLogger(f"mafia.{name}"), context)
+
+
+setup_logging()
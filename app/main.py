@@ -1,20 +1,36 @@
-from fastapi import FastAPI, Depends, HTTPException, Request, Query
+from fastapi import FastAPI, Depends, HTTPException, Request, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.websockets import WebSocket
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_async_db, AsyncSessionLocal
 from app import models, schemas, database
 from app.auth import  get_current_user
-from app.game_rooms.game_rooms import router as game_router
+from app.user_cache import user_cache
+from app.game_rooms.game_rooms import router as game_router, schedule_phase_deadline
 from app.auth import router as auth_router
 import random, string
 models.Base.metadata.create_all(bind=database.engine)
+# create_all не додає нові індекси до таблиць, що вже існують
+for index in models.Messages.__table__.indexes:
+    index.create(bind=database.engine, checkfirst=True)
 from app.game_rooms.room_storage import active_rooms
 from app.game_rooms.game_models import GameRoom
-from typing import Optional
-from sqlalchemy import delete
+from app.game_rooms.chat_writer import chat_writer
+from app.game_rooms.lobby import lobby
+from app.game_rooms.snapshots import snapshot_store
+from app.game_rooms.scheduler import phase_deadlines
+from app.game_rooms.heartbeat import heartbeat
+from app.leaderboard import leaderboard, load_leaderboard
+from app.log import get_logger
+from app.metrics import Gauge, instrument_engine, render_metrics
+from app.config import LOBBY_PAGE_SIZE, LOBBY_PAGE_MAX, METRICS_DB_TIMINGS
+from typing import Optional, Literal
+from collections import Counter
+from sqlalchemy import delete, select
 
 app = FastAPI(title="Mafia Game")
+log = get_logger("main")
 
 # Налаштування CORS
 app.add_middleware(
@@ -28,6 +44,55 @@ app.add_middleware(
 app.include_router(game_router, prefix="/api")
 app.include_router(auth_router, prefix="/auth", tags=["Auth"])
 
+if METRICS_DB_TIMINGS:
+    instrument_engine(database.engine)
+    instrument_engine(database.async_engine.sync_engine)
+
+# Показники стану кімнат рахуються лише під час запиту /metrics
+Gauge("mafia_active_rooms", "Rooms held in memory by this worker",
+      lambda: {(): len(active_rooms)})
+Gauge("mafia_connected_players", "Players with an open websocket on this worker",
+      lambda: {(): sum(p.is_connected for room in active_rooms.values() for p in room.players.values())})
+Gauge("mafia_games", "Rooms in memory by game phase",
+      lambda: {(phase,): n for phase, n in Counter(room.phase.label for room in active_rooms.values()).items()},
+      labelnames=("phase",))
+
+@app.on_event("startup")
+async def start_background_tasks():
+    await active_rooms.start()
+    chat_writer.start()
+    heartbeat.start()
+    # Лобі живе в пам'яті, тому після рестарту наповнюємо його з бази
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(models.Room).where(models.Room.is_active == True))
+        lobby.load(result.scalars().all())
+    # Відновлюємо ігри, що йшли до рестарту; гравці повернуться при перепідключенні
+    restored = 0
+    for room in snapshot_store.load_all():
+        if room.id not in lobby.entries:
+            # Кімнату видалили або гра вже завершена в базі
+            snapshot_store.delete(room.id)
+            continue
+        # Кімнату вже забрав інший воркер; знімок лишаємо, він може бути його
+        if await active_rooms.claim(room.id) != active_rooms.worker_id:
+            continue
+        active_rooms[room.id] = room
+        lobby.sync(room)
+        # Відлік фази після рестарту починається заново
+        schedule_phase_deadline(room)
+        restored += 1
+    log.info("rooms restored from snapshots", rooms=restored)
+    await load_leaderboard()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    # Дописуємо в базу повідомлення чату, що ще в черзі
+    await chat_writer.stop()
+    await heartbeat.stop()
+    await phase_deadlines.stop()
+    await snapshot_store.close()
+    await active_rooms.stop()
+
 # WebSocket тестовий ендпоінт
 @app.websocket("/ws/test")
 async def websocket_test(websocket: WebSocket):
@@ -37,7 +102,7 @@ async def websocket_test(websocket: WebSocket):
             data = await websocket.receive_text()
             await websocket.send_text(f"Message received: {data}")
     except Exception as e:
-        print(f"WebSocket test error: {e}")
+        log.info("websocket test error", error=str(e))
         await websocket.close()
 
 @app.get("/")
@@ -45,15 +110,31 @@ async def root():
     return {"message": "Welcome to Mafia Game API"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/rooms", response_model=list[schemas.RoomResponse])
-async def get_active_rooms(db: Session = Depends(get_db)):
-    rooms = db.query(models.Room).filter(models.Room.is_active == True).all()
-    return rooms
+async def get_active_rooms(
+        request: Request,
+        private: Optional[bool] = Query(None),
+        full: Optional[bool] = Query(None),
+        in_progress: Optional[bool] = Query(None),
+        offset: int = Query(0, ge=0),
+        limit: int = Query(LOBBY_PAGE_SIZE, ge=1, le=LOBBY_PAGE_MAX)
+):
+    # Лобі опитують найчастіше: віддаємо з пам'яті, а незмінну сторінку - як 304
+    body, etag = lobby.page(private=private, full=full, in_progress=in_progress, offset=offset, limit=limit)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.get("/api/rooms/{room_id}", response_model=schemas.RoomResponse)
-async def get_room(room_id: int, db: Session = Depends(get_db)):
-    room = db.query(models.Room).filter(models.Room.id == room_id).first()
+async def get_room(room_id: int, db: AsyncSession = Depends(get_async_db)):
+    room = await db.get(models.Room, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     return room
@@ -67,8 +148,7 @@ async def create_room(
         db: Session = Depends(get_db)
 ):
     try:
-        print(f"Creating room with data: {room.dict()}")
-        print(f"Current user: {current_user}")
+        log.info("creating room", name=room.name, is_private=room.is_private)
         
         if room.is_private and not password: 
             raise HTTPException(status_code=400, detail="Password is required for private rooms")
@@ -79,8 +159,6 @@ async def create_room(
         else:
             owner_id = current_user.id
 
-        print(f"Creating room with owner_id: {owner_id}")
-
         db_room = models.Room(
             name=room.name,
             password=password,
@@ -91,30 +169,27 @@ async def create_room(
             is_active=True  # Додаємо це поле
         )
         
-        print(f"Created db_room object: {db_room.__dict__}")
-        
         db.add(db_room)
         db.commit()
         db.refresh(db_room)
-
-        print(f"Room saved to database with id: {db_room.id}")
+        log.info("room saved", room_id=db_room.id, owner=owner_id)
 
         game_room = GameRoom(
-            room_id=db_room.id,
-            room_name=db_room.name,
-            owner=owner_id,
+            id=db_room.id,
+            name=db_room.name,
+            owner_id=owner_id,
             min_players=db_room.min_players_number,
             max_players=db_room.max_players_number,
-            is_private=db_room.is_private,
         )
         
-        print(f"Created game_room object: {game_room.__dict__}")
-        
-        active_rooms[db_room.id] = game_room
+        # Нову кімнату закріплюємо за цим воркером; якщо ні, її створить власник при підключенні
+        if await active_rooms.claim(db_room.id) == active_rooms.worker_id:
+            active_rooms[db_room.id] = game_room
+        lobby.add_room(db_room)
         return db_room
         
     except Exception as e:
-        print(f"Error creating room: {str(e)}")
+        log.error("error creating room", exc_info=True)
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -128,20 +203,25 @@ async def delete_room(
 ):
     
     room = delete(models.Room).where(models.Room.id == room_id, models.Room.owner == current_user.id)
-    db.execute(room)
+    result = db.execute(room)
     db.commit()
 
-    if room_id in active_rooms: 
-        del active_rooms[room_id]
+    # Прибираємо кімнату з пам'яті, лише якщо її справді видалив власник
+    if result.rowcount:
+        active_rooms.pop(room_id, None)
+        phase_deadlines.cancel(room_id)
+        await active_rooms.release(room_id)
+        lobby.remove_room(room_id)
+        snapshot_store.delete(room_id)
     return {"message": "Room deleted successfully"}
 
 # User profile routes
 @app.get("/api/users/{user_id}", response_model=schemas.UserResponse)
 async def get_user_profile(
         user_id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -156,35 +236,43 @@ async def get_my_profile(current_user: models.User = Depends(get_current_user)):
 async def add_friend(
         friend_data: schemas.AddFriend,
         current_user: models.User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
-    friend = db.query(models.User).filter(models.User.id == friend_data.friend_id).first()
+    friend = await db.get(models.User, friend_data.friend_id)
     if not friend:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if not current_user.friends:
-        current_user.friends = []
+    # current_user - знімок з кешу, змінюємо сам рядок у базі
+    user = await db.get(models.User, current_user.id)
+    friends = user.friends or []
 
-    if friend_data.friend_id in current_user.friends:
+    if friend_data.friend_id in friends:
         raise HTTPException(status_code=400, detail="User is already in your friends list")
 
-    current_user.friends.append(friend_data.friend_id)
-    db.commit()
+    # Присвоюємо новий список, бо зміну JSON-колонки на місці SQLAlchemy не помічає
+    user.friends = friends + [friend_data.friend_id]
+    await db.commit()
+    user_cache.invalidate(email=user.email)
     return {"message": "Friend added successfully"}
 
 
 @app.get("/api/leaderboard")
-async def get_leaderboard(db: Session = Depends(get_db)):
-    top_players = db.query(models.User).order_by(models.User.matches.desc()).limit(10).all()
-    return [
-        {
-            "id": player.id,
-            "username": player.username,
-            "matches": player.matches,
-            "survivor_matches": player.survivor_matches,
-            "mafia_matches": player.mafia_matches
-        }
-        for player in top_players
-    ]
+async def get_leaderboard(
+        order_by: Literal["matches", "survivor_matches", "mafia_matches"] = Query("matches"),
+        offset: int = Query(0, ge=0),
+        limit: int = Query(10, ge=1, le=100)
+):
+    return leaderboard.top(order_by=order_by, offset=offset, limit=limit)
+
+
+@app.get("/api/leaderboard/{user_id}")
+async def get_leaderboard_rank(
+        user_id: int,
+        order_by: Literal["matches", "survivor_matches", "mafia_matches"] = Query("matches")
+):
+    entry = leaderboard.rank(user_id, order_by=order_by)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return entry
 
 # uvicorn app.main:app --reload
\ No newline at end of file
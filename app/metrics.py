@@ -0,0 +1,150 @@
+import bisect
+import time
+from sqlalchemy import event
+
+# Межі кошиків гістограм затримок, у секундах
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Межі кошиків для кількості отримувачів розсилки
+RECIPIENT_BUCKETS = (1, 2, 4, 6, 8, 10, 12)
+
+_registry = []
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# Лічильник, що лише зростає
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+# Показник, що обчислюється в момент запиту /metrics: функція повертає {мітки: значення}
+class Gauge:
+    def __init__(self, name, documentation, collect, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in self.collect().items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+# Гістограма з фіксованими кошиками: observe - це бінарний пошук і два додавання
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}  # мітки -> [лічильники кошиків..., +Inf, сума]
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain} {series[-1]}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+def render_metrics():
+    """Усі метрики в текстовому форматі Prometheus"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+handler_latency = Histogram(
+    "mafia_ws_handler_seconds", "Time spent handling one websocket message", ("type",))
+broadcast_latency = Histogram(
+    "mafia_broadcast_seconds", "Time spent in one room broadcast; with BROADCAST_FANOUT only encoding and queueing")
+delivery_latency = Histogram(
+    "mafia_ws_delivery_seconds", "Time from queueing a frame for a client until its send completes")
+broadcast_recipients = Histogram(
+    "mafia_broadcast_recipients", "Players a room broadcast was sent to", buckets=RECIPIENT_BUCKETS)
+players_dropped = Counter(
+    "mafia_players_dropped_total", "Connections dropped by the server: slow sends and missed heartbeats")
+heartbeat_timeouts = Counter(
+    "mafia_heartbeat_timeouts_total", "Connections evicted after missing heartbeats")
+frames_throttled = Counter(
+    "mafia_ws_frames_throttled_total", "Inbound websocket frames rejected by rate limits", ("type", "scope"))
+rooms_reaped = Counter(
+    "mafia_rooms_reaped_total", "Rooms removed from memory after staying without live connections")
+db_query_latency = Histogram(
+    "mafia_db_query_seconds", "Database statement execution time", ("statement",))
+
+
+def instrument_engine(engine):
+    """Підключає заміри запитів до двигуна SQLAlchemy (для async - до engine.sync_engine)"""
+    # Початок запиту за контекстом виконання: невдалий запит прибирається в handle_error
+    # і не зсуває заміри наступних
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", {})[id(context)] = time.perf_counter()
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None:
+            conn.info.get("query_started", {}).pop(id(exception_context.execution_context), None)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop(id(context))
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement else "OTHER"
+        db_query_latency.observe(time.perf_counter() - started, kind)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.types import JSON
 from app.database import Base
@@ -21,6 +21,8 @@ class User(Base):
 
 class Messages(Base):
     __tablename__ = "message"
+    # Історія кімнати гортається за id, тому індекс саме (room_id, id)
+    __table_args__ = (Index("ix_message_room_id_id", "room_id", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     message = Column(Text)
@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import List, Optional, Union
-from pydantic import validator
+from pydantic import validator, Field
+from app.config import CHAT_MESSAGE_MAX_LENGTH
 
 class UserBase(BaseModel):
     id: int
@@ -36,7 +37,18 @@ class Token(BaseModel):
     token_type: str
 
 class ChatMessage(BaseModel):
-    message: str
+    message: str = Field(max_length=CHAT_MESSAGE_MAX_LENGTH)
+
+# Payload повідомлень websocket; зайві поля (actor_id, player_id) ігноруються,
+# бо діє завжди гравець, якому належить з'єднання
+class EmptyPayload(BaseModel):
+    pass
+
+class NightActionPayload(BaseModel):
+    target_id: int
+
+class VotePayload(BaseModel):
+    target_id: int
 
 class AddFriend(BaseModel):
     friend_id: int
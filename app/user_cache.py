@@ -0,0 +1,70 @@
+import time
+from collections import OrderedDict
+from app.config import USER_CACHE_TTL, USER_CACHE_SIZE
+
+# Легкий знімок користувача: все, що потрібно автентифікованим запитам, без сесії бази
+class UserSnapshot:
+    __slots__ = ("id", "username", "email", "friends", "matches", "survivor_matches",
+                 "mafia_matches", "is_host", "is_admin")
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.friends = list(user.friends or [])
+        self.matches = user.matches or 0
+        self.survivor_matches = user.survivor_matches or 0
+        self.mafia_matches = user.mafia_matches or 0
+        self.is_host = bool(user.is_host)
+        self.is_admin = bool(user.is_admin)
+
+    def __repr__(self):
+        return f"UserSnapshot(id={self.id}, username={self.username!r})"
+
+
+# TTL/LRU кеш знімків за email (subject токена)
+class UserCache:
+    def __init__(self, ttl=USER_CACHE_TTL, maxsize=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # email -> (час завершення, знімок)
+        self.emails = {}  # id -> email, щоб інвалідувати за id
+
+    def get(self, email):
+        entry = self.entries.get(email)
+        if entry is None:
+            return None
+        expires_at, snapshot = entry
+        if expires_at < time.monotonic():
+            self._remove(email)
+            return None
+        self.entries.move_to_end(email)
+        return snapshot
+
+    def put(self, user):
+        snapshot = UserSnapshot(user)
+        self._remove(snapshot.email)
+        self.entries[snapshot.email] = (time.monotonic() + self.ttl, snapshot)
+        self.emails[snapshot.id] = snapshot.email
+        while len(self.entries) > self.maxsize:
+            self._remove(next(iter(self.entries)))
+        return snapshot
+
+    def invalidate(self, email=None, user_id=None):
+        """Викликати після зміни профілю, друзів або статистики користувача"""
+        if email is None and user_id is not None:
+            email = self.emails.get(user_id)
+        if email is not None:
+            self._remove(email)
+
+    def clear(self):
+        self.entries.clear()
+        self.emails.clear()
+
+    def _remove(self, email):
+        entry = self.entries.pop(email, None)
+        if entry is not None:
+            self.emails.pop(entry[1].id, None)
+
+
+user_cache = UserCache()
@@ -0,0 +1,101 @@
+"""
+Вимірює, наскільки запити до бази блокують event loop:
+синхронна сесія (як раніше в async-ендпоінтах) проти асинхронної.
+
+    python -m benchmarks.event_loop_stall --queries 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.models import Base, User, Room
+
+
+# Тікає кожну мілісекунду і записує, наскільки пізно прокинувся
+async def monitor_loop(stop, interval=0.001):
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - started - interval))
+    return lags
+
+
+def seed(path, users):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add_all(User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x") for i in range(users))
+        db.add_all(Room(name=f"room{i}") for i in range(users // 10 + 1))
+        db.commit()
+    engine.dispose()
+
+
+async def run_sync(path, queries, concurrency, users):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Session = sessionmaker(bind=engine)
+
+    async def worker(worker_id):
+        for i in range(worker_id, queries, concurrency):
+            with Session() as db:
+                db.query(User).filter(User.email == f"user{i % users}@example.com").first()
+                db.query(Room).filter(Room.id == i % (users // 10) + 1).first()
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    engine.dispose()
+
+
+async def run_async(path, queries, concurrency, users):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def worker(worker_id):
+        for i in range(worker_id, queries, concurrency):
+            async with Session() as db:
+                await db.execute(select(User).where(User.email == f"user{i % users}@example.com"))
+                await db.get(Room, i % (users // 10) + 1)
+
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    await engine.dispose()
+
+
+async def measure(name, runner, *args):
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop(stop))
+    started = time.perf_counter()
+    await runner(*args)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    lags = sorted(await monitor)
+    if not lags:
+        lags = [elapsed]
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+    stalled = sum(lag for lag in lags if lag > 0.005)
+    print(f"{name:>6}: {elapsed:7.3f} s total, loop lag max {lags[-1] * 1000:7.2f} ms, "
+          f"p99 {p99 * 1000:6.2f} ms, stalled >5ms {stalled * 1000:8.1f} ms, ticks {len(lags)}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.users)
+        await measure("sync", run_sync, path, args.queries, args.concurrency, args.users)
+        await measure("async", run_async, path, args.queries, args.concurrency, args.users)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
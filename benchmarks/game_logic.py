@@ -0,0 +1,208 @@
+"""
+Мікробенчмарки ігрової логіки GameRoom/Player на кімнатах з 4-12 гравців
+з порогами регресії, а також прогони по популяціях з 10 000 і 100 000 кімнат
+(пам'ять і час CPU на кімнату) для оцінки пам'яті воркера.
+
+    python -m benchmarks.game_logic
+    python -m benchmarks.game_logic --check          # код 1, якщо поріг перевищено
+    python -m benchmarks.game_logic --population 10000 100000
+    python -m benchmarks.game_logic --population 0   # без прогону популяції
+"""
+import argparse
+import asyncio
+import io
+import random
+import sys
+import time
+import tracemalloc
+
+from app.log import setup_logging
+from app.game_rooms import game_rooms
+from app.game_rooms.game_models import GameRoom, Player, Role, Phase
+from app.schemas import VotePayload
+
+ROOM_SIZES = (4, 6, 8, 10, 12)
+
+# Пороги регресії в мікросекундах на один виклик, з запасом приблизно в 10 разів від
+# найбільшого виміряного значення серед розмірів кімнат (зазвичай це кімната з 12 гравців);
+# усі розміри кімнат мають ті самі пороги. Виміряно на CPython 3.11, у дужках - максимум.
+THRESHOLDS_US = {
+    "GameRoom.to_dict": 250,  # (24)
+    "Player.to_dict": 10,  # (0.9)
+    "check_victory": 15,  # (1.4)
+    "can_start_game": 35,  # (3.3)
+    "assign_roles": 300,  # (30)
+    "add_player+remove_player": 1000,  # (93)
+    "resolve_night": 4000,  # (388)
+    "vote (per ballot)": 600,  # (59)
+}
+
+
+class NullWebSocket:
+    async def send_text(self, frame):
+        pass
+
+    async def close(self, code=1000):
+        pass
+
+
+# Знімки стану тут не потрібні: міряємо логіку, а не запис на диск
+class NullSnapshots:
+    def save(self, room):
+        pass
+
+    def delete(self, room_id):
+        pass
+
+
+def make_room(room_id, size):
+    # Одне вільне місце, щоб add_player проходив повний шлях, а не відмову "кімната заповнена"
+    room = GameRoom(id=room_id, name=f"bench{room_id}", owner_id=1, min_players=4, max_players=size + 1)
+    for player_id in range(1, size + 1):
+        room.add_player(Player(id=player_id, name=f"player{player_id}", websocket=NullWebSocket()))
+    return room
+
+
+def deal_roles(room):
+    """Одна мафія, лікар, детектив, решта мирні: ні ніч, ні голосування не завершують гру"""
+    roles = [Role.MAFIA, Role.DOCTOR, Role.DETECTIVE]
+    for i, player in enumerate(room.players.values()):
+        room.set_role(player, roles[i] if i < len(roles) else Role.CIVILIAN)
+    room.reset_players()
+
+
+def bench(number, fn):
+    started = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - started) / number
+
+
+async def abench(number, fn):
+    started = time.perf_counter()
+    for _ in range(number):
+        await fn()
+    return (time.perf_counter() - started) / number
+
+
+async def drain(room):
+    # Даємо задачам відправки розібрати черги, щоб вони не накопичувались між прогонами
+    await asyncio.sleep(0)
+    for player in room.players.values():
+        if player.outbox is not None:
+            while not player.outbox.empty():
+                player.outbox.get_nowait()
+
+
+async def measure(size, number):
+    room = make_room(1, size)
+    deal_roles(room)
+    players = list(room.players.values())
+    mafia, doctor, detective = players[0], players[1], players[2]
+    results = {}
+
+    for p in players:
+        p.is_ready = True
+    results["GameRoom.to_dict"] = bench(number, room.to_dict)
+    results["Player.to_dict"] = bench(number, players[-1].to_dict)
+    results["check_victory"] = bench(number, room.check_victory)
+    results["can_start_game"] = bench(number, room.can_start_game)
+    results["assign_roles"] = bench(number, room.assign_roles)
+    deal_roles(room)
+
+    extra_id = size + 1
+
+    def join_and_leave():
+        room.add_player(Player(id=extra_id, name="extra", websocket=NullWebSocket()))
+        room.remove_player(extra_id)
+    results["add_player+remove_player"] = bench(number, join_and_leave)
+    room.owner = 1
+
+    async def night():
+        deal_roles(room)
+        room.phase = Phase.NIGHT
+        room.night_actions.record(mafia, players[-1].id)
+        room.night_actions.record(doctor, doctor.id)
+        room.night_actions.record(detective, mafia.id)
+        await game_rooms.resolve_night(room)
+        await drain(room)
+    results["resolve_night"] = await abench(number // 10 or 1, night)
+
+    async def day():
+        deal_roles(room)
+        room.phase = Phase.DAY
+        room.votes.clear()
+        # Голоси порівну між двома гравцями: день не вирішується достроково, і кожен бюлетень
+        # проходить повний шлях, а нічия нікого не вбиває
+        targets = (players[-1].id, players[-2].id)
+        for i, p in enumerate(players):
+            await game_rooms.handle_vote(room, p, VotePayload(target_id=targets[i % 2]))
+        await drain(room)
+    results["vote (per ballot)"] = await abench(number // 10 or 1, day) / size
+
+    for p in room.players.values():
+        p.stop_sender()
+    return results
+
+
+def population(rooms):
+    """Пам'ять і час одного проходу логіки по всій популяції кімнат"""
+    rng = random.Random(1)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    population = [make_room(i, rng.randint(4, 12)) for i in range(rooms)]
+    for room in population:
+        room.assign_roles()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    players = sum(len(room.players) for room in population)
+
+    started = time.process_time()
+    for room in population:
+        room.to_dict()
+        room.check_victory()
+        room.can_start_game()
+    cpu = time.process_time() - started
+
+    print(f"population: {rooms} rooms, {players} players")
+    print(f"  memory: {allocated / rooms:10.0f} bytes/room, {allocated / players:8.0f} bytes/player")
+    print(f"  cpu:    {cpu / rooms * 1e6:10.2f} us/room per pass (to_dict, check_victory, can_start_game)")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=2000, help="iterations per operation")
+    parser.add_argument("--population", type=int, nargs="*", default=[10000, 100000],
+                        help="rooms in each population run, 0 to skip")
+    parser.add_argument("--check", action="store_true", help="exit with code 1 if a threshold is exceeded")
+    args = parser.parse_args()
+
+    # Вивід логів у пам'ять, щоб не міряти термінал
+    setup_logging(level="INFO", stream=io.StringIO())
+    game_rooms.snapshot_store = NullSnapshots()
+
+    failed = []
+    print(f"{'operation':<26}" + "".join(f"{size:>9}p" for size in ROOM_SIZES) + f"{'limit':>10}  (us/call)")
+    table = {size: await measure(size, args.number) for size in ROOM_SIZES}
+    for name, limit in THRESHOLDS_US.items():
+        row = [table[size][name] * 1e6 for size in ROOM_SIZES]
+        over = any(value > limit for value in row)
+        if over:
+            failed.append(name)
+        print(f"{name:<26}" + "".join(f"{value:>10.2f}" for value in row) + f"{limit:>10}" + ("  REGRESSION" if over else ""))
+
+    # Записи логів у черзі теж займають пам'ять, тому під час прогону популяції лише попередження
+    setup_logging(level="WARNING", stream=io.StringIO())
+    for rooms in args.population:
+        if rooms:
+            population(rooms)
+    setup_logging()
+
+    if args.check and failed:
+        print(f"thresholds exceeded: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
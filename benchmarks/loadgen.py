@@ -0,0 +1,385 @@
+"""
+Навантаження на websocket кімнат: N клієнтів у M кімнатах грають повні ігри
+(вхід, toggle_ready, start_game, нічні дії, чат, голосування) і звітують
+повідомлення за секунду, p50/p95/p99 затримки на тип повідомлення та помилки.
+
+    python -m benchmarks.loadgen --rooms 20 --players 6 --serve
+    python -m benchmarks.loadgen --rooms 20 --players 6 --url http://127.0.0.1:8000
+    python -m benchmarks.loadgen --rooms 20 --players 6 --serve --encoding msgpack --compress deflate
+
+Затримка рахується від відправки кадру до першої відповіді сервера на нього:
+chat - власне відлуння, toggle_ready - player_ready, start_game - game_started,
+sync - room_state, vote - vote_cast; night_action - до розв'язання ночі
+(phase_change або game_over), бо окремої відповіді на нічну дію немає.
+Боти тримаються власних лімітів гравця (PLAYER_RATE_LIMITS), чекаючи на токен перед
+кадром; це очікування в затримку не входить. Чат, відкинутий спільним лімітом кімнати,
+отримує помилку замість відлуння і звітується як chat:rejected, а не як помилка.
+
+Реєстрація і вхід ідуть не більше ніж --login-concurrency одночасно, нижче за чергу
+bcrypt сервера (BCRYPT_MAX_PENDING); відповіді 503 повторюються після Retry-After.
+Клієнт, що не зміг увійти, рахується помилкою, а його кімната не грає.
+З --serve сервер працює з тимчасовою базою і знімками, а не з ./mafia.db.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import httpx
+import websockets
+
+from app.config import PLAYER_RATE_LIMITS
+from app.game_rooms.protocol import negotiate_codec
+from app.game_rooms.ratelimit import TokenBucket
+
+NIGHT_ROLES = ("mafia", "doctor", "detective")
+# День закінчується, щойно результат голосування вирішено, тож пізній голос - не помилка
+VOTE_REJECTIONS = {"Голосування відбувається лише вдень"}
+# Власні ліміти гравця (PLAYER_RATE_LIMITS) бот не перевищує, бо чекає на токен перед кадром.
+# Спільний ліміт чату кімнати (ROOM_RATE_LIMITS) окремий бот передбачити не може, тож у великих
+# кімнатах з короткими днями відмова кімнати очікувана і теж є відповіддю на кадр чату
+ROOM_THROTTLED = "У кімнаті забагато повідомлень, зачекайте"
+PLAYER_THROTTLED = "Забагато повідомлень, зачекайте"
+EXPECTED_REJECTIONS = VOTE_REJECTIONS | {ROOM_THROTTLED}
+# Скільки разів повторювати запит, відхилений сервером з 503 через перевантаження bcrypt
+LOGIN_RETRIES = 10
+
+
+class Stats:
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.received_bytes = 0
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.games = 0
+
+    def report(self, elapsed):
+        print(f"games finished: {self.games}, elapsed {elapsed:.2f}s")
+        print(f"sent {self.sent} ({self.sent / elapsed:.1f}/s), "
+              f"received {self.received} ({self.received / elapsed:.1f}/s), "
+              f"{self.received_bytes / max(self.received, 1):.0f} bytes/frame")
+        print(f"{'type':<14}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for message_type, values in sorted(self.latencies.items()):
+            values.sort()
+            p50, p95, p99 = (percentile(values, q) * 1000 for q in (50, 95, 99))
+            print(f"{message_type:<14}{len(values):>8}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}")
+        if self.errors:
+            print("errors:")
+            for error, count in self.errors.most_common():
+                print(f"  {error}: {count}")
+        else:
+            print("errors: none")
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+# Один симульований гравець: HTTP для входу, websocket для гри
+class Bot:
+    def __init__(self, stats, run_id, index, timeout, codec):
+        self.stats = stats
+        self.codec = codec
+        self.query = f"&encoding={codec.encoding}" + ("&compress=deflate" if codec.compress else "")
+        self.timeout = timeout
+        self.name = f"load-{run_id}-{index}"
+        self.email = f"{self.name}@load.test"
+        self.password = "load-password"
+        self.token = None
+        self.id = None
+        self.role = None
+        self.allies = set()
+        self.alive = {}  # id гравця -> живий
+        self.ws = None
+        self.reader = None
+        # Копії відер сервера для цього з'єднання; ключ "*" - усі кадри
+        self.buckets = {key: TokenBucket(*limit) for key, limit in PLAYER_RATE_LIMITS.items()}
+        self.events = asyncio.Queue()
+        self.waiters = []
+
+    async def login(self, http, limiter):
+        """Реєстрація і вхід; невдача рахується помилкою, а не перериває прогін"""
+        try:
+            async with limiter:
+                response = await post_retrying(http, "/auth/register", json={
+                    "username": self.name, "email": self.email, "password": self.password})
+                if response.status_code not in (200, 400):
+                    self.stats.errors[f"register:{response.status_code}"] += 1
+                response = await post_retrying(http, "/auth/login", data={
+                    "username": self.email, "password": self.password})
+        except httpx.HTTPError as e:
+            self.stats.errors[f"login:{type(e).__name__}"] += 1
+            return
+        if response.status_code != 200:
+            self.stats.errors[f"login:{response.status_code}"] += 1
+            return
+        self.token = response.json()["access_token"]
+
+    async def connect(self, ws_url, room_id):
+        self.ws = await websockets.connect(f"{ws_url}/api/ws/room/{room_id}?token={self.token}{self.query}")
+        self.reader = asyncio.create_task(self._read())
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self.reader is not None:
+            await asyncio.gather(self.reader, return_exceptions=True)
+
+    async def _read(self):
+        try:
+            async for raw in self.ws:
+                frame = self.codec.decode(raw)
+                self.stats.received += 1
+                self.stats.received_bytes += len(raw)
+                if frame.get("type") == "ping":
+                    # pong не чекає на токен, але сервер теж рахує його в "*"
+                    if "*" in self.buckets:
+                        self.buckets["*"].take(time.monotonic())
+                    await self.ws.send(self.codec.encode({"type": "pong"}))
+                    continue
+                for waiter in list(self.waiters):
+                    predicate, future = waiter
+                    if not future.done() and predicate(frame):
+                        future.set_result(frame)
+                        self.waiters.remove(waiter)
+                self.events.put_nowait(frame)
+        except websockets.ConnectionClosed as e:
+            if e.rcvd is not None and e.rcvd.code not in (1000, 1001):
+                self.stats.errors[f"closed:{e.rcvd.code}"] += 1
+        finally:
+            self.events.put_nowait(None)
+
+    async def request(self, message, expect):
+        """Відправляє кадр і чекає на відповідь, записуючи затримку під типом кадру"""
+        future = asyncio.get_running_loop().create_future()
+        waiter = (expect, future)
+        self.waiters.append(waiter)
+        await self.pace(message["type"])
+        started = time.perf_counter()
+        await self.ws.send(self.codec.encode(message))
+        self.stats.sent += 1
+        try:
+            frame = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.stats.errors[f"timeout:{message['type']}"] += 1
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+            return None
+        # Відмову сервера рахуємо окремо, щоб не змішувати її затримку з обробкою
+        label = message["type"] if frame.get("type") != "error" else f"{message['type']}:rejected"
+        self.stats.latencies[label].append(time.perf_counter() - started)
+        return frame
+
+    async def pace(self, message_type):
+        """Чекає, поки кадр вкладеться в ліміти гравця на сервері"""
+        for key in ("*", message_type):
+            bucket = self.buckets.get(key)
+            while bucket is not None and not bucket.take(time.monotonic()):
+                await asyncio.sleep(1 / bucket.rate)
+
+    async def next_event(self):
+        frame = await asyncio.wait_for(self.events.get(), self.timeout)
+        if frame is None:
+            raise ConnectionError("connection closed")
+        if frame.get("type") == "error" and frame.get("message") not in EXPECTED_REJECTIONS:
+            self.stats.errors[f"server:{frame.get('message')}"] += 1
+        return frame
+
+    async def refresh(self):
+        state = await self.request({"type": "sync"}, lambda f: f.get("type") == "room_state")
+        if state is None:
+            return
+        self.alive = {p["id"]: p["is_alive"] for p in state["players"]}
+        if self.id is None:
+            self.id = next(p["id"] for p in state["players"] if p["name"] == self.name)
+
+    def pick_target(self, exclude):
+        candidates = [pid for pid, alive in self.alive.items() if alive and pid not in exclude]
+        return random.choice(candidates) if candidates else None
+
+    async def night(self):
+        if not self.alive.get(self.id) or self.role not in NIGHT_ROLES:
+            return
+        exclude = {self.id} | self.allies if self.role == "mafia" else {self.id}
+        target = self.pick_target(exclude)
+        if target is None:
+            return
+        await self.request(
+            {"type": "night_action", "payload": {"actor_id": self.id, "target_id": target}},
+            lambda f: f.get("type") in ("phase_change", "game_over"))
+
+    async def day(self, round_number):
+        if not self.alive.get(self.id):
+            return
+        text = f"round {round_number} from {self.name}"
+        await self.request(
+            {"type": "chat", "payload": {"message": text}},
+            lambda f: (f.get("type") == "chat" and f.get("message") == text)
+            or (f.get("type") == "error" and f.get("message") in (ROOM_THROTTLED, PLAYER_THROTTLED)))
+        target = self.pick_target({self.id})
+        if target is None:
+            return
+        await self.request(
+            {"type": "vote", "payload": {"player_id": self.id, "target_id": target}},
+            lambda f: (f.get("type") == "vote_cast" and f.get("from") == self.name)
+            or (f.get("type") == "error" and f.get("message") in VOTE_REJECTIONS))
+
+    async def play(self, is_owner, players):
+        await self.refresh()
+        await self.request({"type": "toggle_ready"},
+                           lambda f: f.get("type") == "player_ready" and f.get("player_id") == self.id)
+        ready = set()
+        while True:
+            frame = await self.next_event()
+            message_type = frame.get("type")
+            if message_type == "player_ready" and is_owner:
+                (ready.add if frame["is_ready"] else ready.discard)(frame["player_id"])
+                if len(ready) == players:
+                    await self.request({"type": "start_game"}, lambda f: f.get("type") == "game_started")
+            elif message_type == "role_assigned":
+                self.role = frame["role"]
+                self.allies = {m["id"] for m in frame.get("other_mafia", [])}
+            elif message_type == "phase_change":
+                await self.refresh()
+                if frame["phase"] == "night":
+                    await self.night()
+                else:
+                    await self.day(frame["round"])
+            elif message_type == "game_over":
+                return True
+
+
+async def post_retrying(http, path, **kwargs):
+    """POST, що повторюється після Retry-After, поки сервер відповідає 503"""
+    for _ in range(LOGIN_RETRIES):
+        response = await http.post(path, **kwargs)
+        if response.status_code != 503:
+            break
+        await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+    return response
+
+
+async def play_room(http, ws_url, stats, run_id, room_index, bots, game_timeout):
+    players = len(bots)
+    if any(bot.token is None for bot in bots):
+        stats.errors["room:login failed"] += 1
+        return
+    try:
+        owner = bots[0]
+        response = await http.post("/api/rooms", headers={"Authorization": f"Bearer {owner.token}"}, json={
+            "name": f"load-{run_id}-{room_index}",
+            "min_players_number": players,
+            "max_players_number": players,
+        })
+        response.raise_for_status()
+        room_id = response.json()["id"]
+
+        # Власник заходить першим, решта - разом
+        await owner.connect(ws_url, room_id)
+        await asyncio.gather(*(bot.connect(ws_url, room_id) for bot in bots[1:]))
+        results = await asyncio.wait_for(
+            asyncio.gather(*(bot.play(bot is owner, players) for bot in bots)), game_timeout)
+        if all(results):
+            stats.games += 1
+    except asyncio.TimeoutError:
+        stats.errors["timeout:game"] += 1
+    except Exception as e:
+        stats.errors[f"{type(e).__name__}:{e}"] += 1
+    finally:
+        await asyncio.gather(*(bot.close() for bot in bots), return_exceptions=True)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def start_server(data_dir):
+    """Запускає локальний uvicorn в окремому процесі, щоб не ділити з ним event loop;
+    база і знімки сервера - в data_dir, а не в робочих файлах"""
+    port = free_port()
+    env = dict(os.environ,
+               MAFIA_DATABASE_PATH=os.path.join(data_dir, "mafia.db"),
+               MAFIA_SNAPSHOT_DIR=os.path.join(data_dir, "snapshots"))
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+                               env=env)
+    url = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient(base_url=url) as http:
+        for _ in range(100):
+            try:
+                await http.get("/")
+                return process, url
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("server did not start")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--players", type=int, default=6)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--serve", action="store_true", help="start a local server on a free port")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for one reply")
+    parser.add_argument("--game-timeout", type=float, default=120.0)
+    parser.add_argument("--login-concurrency", type=int, default=32,
+                        help="registrations/logins in flight, keep below the server BCRYPT_MAX_PENDING")
+    parser.add_argument("--encoding", choices=("json", "msgpack"), default="json")
+    parser.add_argument("--compress", choices=("none", "deflate"), default="none")
+    args = parser.parse_args()
+    codec = negotiate_codec(args.encoding, args.compress)
+    if codec is None:
+        parser.error(f"encoding {args.encoding} with compress={args.compress} is not available")
+
+    process = None
+    data_dir = None
+    url = args.url
+    if args.serve:
+        data_dir = tempfile.mkdtemp(prefix="mafia-loadgen-")
+        process, url = await start_server(data_dir)
+    ws_url = "ws" + url[len("http"):]
+    run_id = uuid.uuid4().hex[:8]
+    stats = Stats()
+
+    try:
+        limits = httpx.Limits(max_connections=args.rooms * args.players)
+        async with httpx.AsyncClient(base_url=url, timeout=60.0, limits=limits) as http:
+            # Реєстрація і вхід (bcrypt) - окремо, щоб не змішувати їх з грою
+            bots = [Bot(stats, run_id, i, args.timeout, codec) for i in range(args.rooms * args.players)]
+            started = time.perf_counter()
+            limiter = asyncio.Semaphore(args.login_concurrency)
+            await asyncio.gather(*(bot.login(http, limiter) for bot in bots))
+            login_elapsed = time.perf_counter() - started
+
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                play_room(http, ws_url, stats, run_id, i, bots[i * args.players:(i + 1) * args.players], args.game_timeout)
+                for i in range(args.rooms)))
+            elapsed = time.perf_counter() - started
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if data_dir is not None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"rooms={args.rooms} players={args.players} clients={len(bots)} url={url}")
+    print(f"login: {len(bots)} clients in {login_elapsed:.2f}s")
+    stats.report(elapsed)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""
+Пропускна здатність циклу повідомлень кімнати з логуванням на рівні INFO і DEBUG.
+Імітує чат у кімнаті з 12 гравців: кожен кадр логується і розсилається всім.
+
+    python -m benchmarks.logging_throughput --frames 20000
+"""
+import argparse
+import asyncio
+import io
+import logging
+import time
+
+from app.log import get_logger, setup_logging
+from app.game_rooms.game_models import GameRoom, Player
+
+
+class NullWebSocket:
+    async def send_text(self, frame):
+        pass
+
+
+async def run(frames, players):
+    room = GameRoom(id=1, name="bench", owner_id=1, max_players=players)
+    for player_id in range(1, players + 1):
+        room.add_player(Player(id=player_id, name=f"player{player_id}", websocket=NullWebSocket()))
+    conn_log = get_logger("bench").bind(room_id=room.id, player_id=1)
+
+    started = time.perf_counter()
+    for i in range(frames):
+        conn_log.sampled(logging.DEBUG, "frame received", message_type="chat")
+        await room.broadcast({"type": "chat", "username": "player1", "message": f"message {i}"})
+        # Даємо задачам відправки розібрати черги
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    for player in room.players.values():
+        player.stop_sender()
+    return frames / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--players", type=int, default=12)
+    args = parser.parse_args()
+
+    # Прогрів, щоб перший рівень не платив за ініціалізацію
+    setup_logging(level="INFO", stream=io.StringIO())
+    await run(min(args.frames, 2000), args.players)
+
+    for level in ("INFO", "DEBUG"):
+        # Вивід у пам'ять, щоб міряти саме логування, а не термінал
+        setup_logging(level=level, stream=io.StringIO())
+        rate = await run(args.frames, args.players)
+        print(f"{level:>5}: {rate:10.0f} frames/s")
+    setup_logging()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,46 @@
+"""
+Скільки входів за секунду витримує перевірка паролів через пул bcrypt,
+в сумі і в розрахунку на одне ядро.
+
+    python -m benchmarks.login_throughput --logins 200 --workers 4 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import bcrypt
+
+from app import auth
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rounds", type=int, default=auth.BCRYPT_ROUNDS)
+    args = parser.parse_args()
+
+    hashed = bcrypt.hashpw(b"password", bcrypt.gensalt(rounds=args.rounds)).decode("utf-8")
+    auth.hash_executor = auth.ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="bcrypt")
+    auth.BCRYPT_MAX_PENDING = max(auth.BCRYPT_MAX_PENDING, args.logins)
+
+    # Для порівняння: той самий bcrypt прямо в event loop, по одному
+    started = time.perf_counter()
+    for _ in range(min(args.logins, 20)):
+        auth.verify_password("password", hashed)
+    inline_rate = min(args.logins, 20) / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(auth.verify_password_async("password", hashed) for _ in range(args.logins)))
+    elapsed = time.perf_counter() - started
+    assert all(results)
+
+    rate = args.logins / elapsed
+    print(f"rounds={args.rounds} workers={args.workers}")
+    print(f"inline: {inline_rate:8.1f} logins/s (event loop blocked for the whole time)")
+    print(f"pool:   {rate:8.1f} logins/s, {rate / args.workers:8.1f} logins/s per core")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
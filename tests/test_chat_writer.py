@@ -0,0 +1,39 @@
+import asyncio
+from app.game_rooms.chat_writer import ChatWriter
+
+
+def recording_writer():
+    writer = ChatWriter(batch_size=10, flush_interval=0.01)
+    written = []
+
+    async def write(batch):
+        written.extend(message["message"] for message in batch)
+
+    writer._write = write
+    return writer, written
+
+
+def test_stop_flushes_queued_messages():
+    async def scenario():
+        writer, written = recording_writer()
+        writer.start()
+        for i in range(25):
+            writer.submit(1, 1, f"message {i}")
+        await writer.stop()
+        assert written == [f"message {i}" for i in range(25)]
+
+    asyncio.run(scenario())
+
+
+def test_submit_after_stop_is_refused():
+    async def scenario():
+        writer, written = recording_writer()
+        writer.start()
+        writer.submit(1, 1, "before")
+        await writer.stop()
+        writer.submit(1, 1, "after")
+        # Зупинений записувач не запускається знову
+        assert writer.task is None
+        assert written == ["before"]
+
+    asyncio.run(scenario())
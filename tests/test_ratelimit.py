@@ -0,0 +1,89 @@
+from app.game_rooms.ratelimit import FrameLimiter, TokenBucket
+
+
+def bucket(rate, capacity):
+    bucket = TokenBucket(rate, capacity)
+    bucket.updated = 0.0
+    return bucket
+
+
+def test_bucket_allows_burst_then_refuses():
+    chat = bucket(1, 3)
+    assert [chat.take(0.0) for _ in range(4)] == [True, True, True, False]
+
+
+def test_bucket_refills_at_rate():
+    chat = bucket(2, 2)
+    assert chat.take(0.0) and chat.take(0.0)
+    assert not chat.take(0.2)
+    # 0.5 с при 2 токенах за секунду - рівно один токен
+    assert chat.take(0.5)
+    assert not chat.take(0.5)
+
+
+def test_bucket_refill_is_capped_by_capacity():
+    chat = bucket(10, 2)
+    assert chat.take(0.0)
+    # Довгий простій поповнює лише до capacity
+    assert [chat.take(100.0) for _ in range(3)] == [True, True, False]
+
+
+def test_frame_limit_applies_to_every_frame():
+    limiter = FrameLimiter(player_limits={"*": (0.001, 2)}, room_limits={}, worker_limits={})
+    assert [limiter.check_frame() for _ in range(3)] == [None, None, "player"]
+
+
+def test_type_without_limit_is_not_limited():
+    limiter = FrameLimiter(player_limits={}, room_limits={}, worker_limits={})
+    assert all(limiter.check_message("vote", {}) is None for _ in range(100))
+
+
+def test_player_limit():
+    limiter = FrameLimiter(player_limits={"chat": (0.001, 2)}, room_limits={}, worker_limits={})
+    room_buckets = {}
+    assert [limiter.check_message("chat", room_buckets) for _ in range(3)] == [None, None, "player"]
+    # Ліміт одного типу не зачіпає інші
+    assert limiter.check_message("sync", room_buckets) is None
+
+
+def test_room_limit_is_shared_by_players():
+    limits = dict(player_limits={"chat": (0.001, 5)}, room_limits={"chat": (0.001, 3)}, worker_limits={})
+    first, second = FrameLimiter(**limits), FrameLimiter(**limits)
+    room_buckets = {}
+    assert first.check_message("chat", room_buckets) is None
+    assert first.check_message("chat", room_buckets) is None
+    assert second.check_message("chat", room_buckets) is None
+    assert second.check_message("chat", room_buckets) == "room"
+    # Інша кімната має власні відра
+    assert second.check_message("chat", {}) is None
+
+
+def test_worker_limit_is_shared_by_rooms():
+    # Тип з унікальною назвою, щоб не ділити відро воркера з іншими тестами
+    limits = dict(player_limits={}, room_limits={}, worker_limits={"test-worker": (0.001, 2)})
+    first, second = FrameLimiter(**limits), FrameLimiter(**limits)
+    assert first.check_message("test-worker", {}) is None
+    assert second.check_message("test-worker", {}) is None
+    assert first.check_message("test-worker", {}) == "worker"
+
+
+def test_player_strikes_warn_once_and_disconnect():
+    limiter = FrameLimiter(max_strikes=3)
+    assert limiter.reject("player") == (True, False)
+    assert limiter.reject("player") == (False, False)
+    assert limiter.reject("player") == (False, True)
+
+
+def test_accepted_frame_resets_strikes():
+    limiter = FrameLimiter(max_strikes=2)
+    assert limiter.reject("player") == (True, False)
+    limiter.accept()
+    assert limiter.reject("player") == (True, False)
+    assert limiter.reject("player") == (False, True)
+
+
+def test_shared_limits_warn_without_strikes():
+    limiter = FrameLimiter(max_strikes=1)
+    for scope in ("room", "worker", "room"):
+        assert limiter.reject(scope) == (True, False)
+    assert limiter.strikes == 0
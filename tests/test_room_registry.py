@@ -0,0 +1,104 @@
+import asyncio
+from types import SimpleNamespace
+from app.game_rooms.game_models import GameRoom
+from app.game_rooms.lobby import LobbyIndex
+from app.game_rooms.pubsub import InProcessBroker
+from app.game_rooms.room_storage import DistributedRoomRegistry
+
+
+def db_room(room_id):
+    return SimpleNamespace(id=room_id, name=f"room {room_id}", owner=1, min_players_number=6,
+                           max_players_number=10, is_private=False)
+
+
+# Два воркери на одному брокері, кожен зі своїм лобі
+def two_workers(ownership_ttl=60):
+    broker = InProcessBroker()
+    first = DistributedRoomRegistry(broker, "ws://w1", ownership_ttl, lobby=LobbyIndex())
+    second = DistributedRoomRegistry(broker, "ws://w2", ownership_ttl, lobby=LobbyIndex())
+    return first, second
+
+
+async def settle():
+    # Публікацію лобі виконує фонова задача реєстру
+    await asyncio.sleep(0.01)
+
+
+def test_room_is_claimed_by_one_worker():
+    async def scenario():
+        first, second = two_workers()
+        assert await first.claim(1) == "ws://w1"
+        # Другий воркер отримує адресу власника, яку віддає клієнту в reason 4010
+        assert await second.claim(1) == "ws://w1"
+        assert await first.claim(1) == "ws://w1"
+        await first.release(1)
+        assert await second.claim(1) == "ws://w2"
+        # Чужу кімнату звільнити не можна
+        await first.release(1)
+        assert await first.claim(1) == "ws://w2"
+
+    asyncio.run(scenario())
+
+
+def test_ownership_expires_unless_renewed():
+    async def scenario():
+        first, second = two_workers(ownership_ttl=0.2)
+        first[1] = GameRoom(1, "room 1", 1)
+        first[2] = GameRoom(2, "room 2", 1)
+        await first.claim(1)
+        await first.claim(2)
+        del first[2]
+        await asyncio.sleep(0.12)
+        await first.renew()
+        await asyncio.sleep(0.12)
+        # Кімнату в пам'яті власник продовжує, знятої з пам'яті - ні
+        assert await second.claim(1) == "ws://w1"
+        assert await second.claim(2) == "ws://w2"
+        await asyncio.sleep(0.25)
+        assert await second.claim(1) == "ws://w2"
+
+    asyncio.run(scenario())
+
+
+def test_renewer_keeps_rooms_of_running_worker():
+    async def scenario():
+        first, second = two_workers(ownership_ttl=0.15)
+        await first.start()
+        try:
+            first[1] = GameRoom(1, "room 1", 1)
+            await first.claim(1)
+            await asyncio.sleep(0.4)
+            assert await second.claim(1) == "ws://w1"
+        finally:
+            await first.stop()
+        # Зупинений воркер звільняє свої кімнати
+        assert await second.claim(1) == "ws://w2"
+
+    asyncio.run(scenario())
+
+
+def test_lobby_changes_reach_other_worker():
+    async def scenario():
+        first, second = two_workers()
+        await first.start()
+        await second.start()
+        try:
+            first.lobby.add_room(db_room(1))
+            await settle()
+            assert second.lobby.entries[1].name == "room 1"
+            assert second.lobby.page()[1] == first.lobby.page()[1]
+
+            room = GameRoom(1, "room 1", 1)
+            room.players = {1: object(), 2: object()}
+            first.lobby.sync(room)
+            await settle()
+            assert second.lobby.entries[1].players_number == 2
+
+            second.lobby.remove_room(1)
+            await settle()
+            assert 1 not in first.lobby.entries
+        finally:
+            await first.stop()
+            await second.stop()
+
+    asyncio.run(scenario())
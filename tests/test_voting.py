@@ -0,0 +1,95 @@
+from app.game_rooms.voting import VoteTally
+
+
+def tally(ballots):
+    votes = VoteTally()
+    for voter, target in ballots.items():
+        votes.cast(voter, target)
+    return votes
+
+
+def test_cast_counts_votes_per_target():
+    votes = tally({1: 10, 2: 10, 3: 20})
+    assert len(votes) == 3
+    assert 1 in votes and 4 not in votes
+    assert votes.counts == {10: 2, 20: 1}
+    assert votes.top == 2
+
+
+def test_changed_vote_moves_between_targets():
+    votes = tally({1: 10, 2: 10, 3: 20})
+    votes.cast(1, 20)
+    assert votes.counts == {10: 1, 20: 2}
+    assert votes.leader() == 20
+    # Повторний голос за ту саму ціль нічого не змінює
+    votes.cast(1, 20)
+    assert votes.counts == {10: 1, 20: 2}
+    assert len(votes) == 3
+
+
+def test_retract_removes_voter():
+    votes = tally({1: 10, 2: 10, 3: 20})
+    votes.retract(1)
+    votes.retract(1)
+    votes.retract(99)
+    assert 1 not in votes
+    assert votes.counts == {10: 1, 20: 1}
+    assert votes.top == 1
+    assert votes.leader() is None
+
+
+def test_drop_target_returns_its_voters():
+    votes = tally({1: 10, 2: 10, 3: 20})
+    assert sorted(votes.drop_target(10)) == [1, 2]
+    assert votes.drop_target(10) == []
+    assert votes.counts == {20: 1}
+    assert 1 not in votes and 2 not in votes
+    assert votes.leader() == 20
+
+
+def test_leader_and_runner_up():
+    votes = VoteTally()
+    assert votes.leader() is None
+    assert votes.runner_up() == 0
+    votes = tally({1: 10, 2: 10, 3: 10, 4: 20})
+    assert votes.leader() == 10
+    assert votes.runner_up() == 1
+    votes = tally({1: 10, 2: 10, 3: 10})
+    assert votes.runner_up() == 0
+
+
+def test_tie_has_no_leader():
+    votes = tally({1: 10, 2: 10, 3: 20, 4: 20})
+    assert votes.leader() is None
+    assert votes.runner_up() == 2
+
+
+def test_runner_up_skips_empty_counts():
+    votes = tally({1: 10, 2: 10, 3: 10, 4: 10, 5: 20})
+    assert votes.runner_up() == 1
+
+
+def test_is_decided_when_remaining_votes_cannot_catch_up():
+    votes = tally({1: 10, 2: 10, 3: 10})
+    # Двоє, що не голосували, набрали б щонайбільше 2 проти 3
+    assert votes.is_decided(5)
+    # Четверо можуть обігнати
+    assert not votes.is_decided(7)
+
+
+def test_is_decided_when_everyone_voted():
+    votes = tally({1: 10, 2: 20})
+    assert votes.is_decided(2)
+    assert votes.leader() is None
+
+
+def test_possible_tie_is_not_decided():
+    votes = tally({1: 10, 2: 10, 3: 20})
+    assert not votes.is_decided(4)
+
+
+def test_clear():
+    votes = tally({1: 10, 2: 20})
+    votes.clear()
+    assert len(votes) == 0
+    assert votes.counts == {} and votes.top == 0